@@ -12,75 +12,243 @@ import os
 import math
 import random
 import bigger_map as map
-from bigger_map import Map
+from bigger_map import Map, Level, TileGroup, STATIC_LAYERS
 import bigger_sprite as sprite
-from bigger_sprite import SpriteHandler, WallSprite, FloorSprite, HeroSprite, Characteristics
+from bigger_sprite import SpriteHandler, WallSprite, FloorSprite, HeroSprite, Characteristics, SpritePool
+from render_target import RenderTarget, PROFILES
+from sounds import SOUNDS
+from images import IMAGES, SCREENS
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+# longest time in milliseconds the event driven loop sleeps
+# waiting for input before it wakes up to check on things
+IDLE_TIMEOUT = 500
+# milliseconds between steps when the hero walks a route on its own
+ROUTE_STEP_MS = 120
+# events that change what is on screen, anything else such as
+# the mouse moving or the window gaining focus draws nothing new
+REDRAW_EVENTS = (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONUP, pygame.VIDEOEXPOSE,
+                 pygame.VIDEORESIZE, pygame.WINDOWEXPOSED, pygame.WINDOWSIZECHANGED)
+
+class HUD:
+    """Heads up display for the hero's stats. It is drawn
+    into its own small surface that is only re-rendered
+    when the characteristics it shows change, so each
+    frame costs one blit no matter what is on it"""
+
+    def __init__(self, position=(10, 10), height=150):
+        """Create a new HUD
+        position: tuple with the x and y screen position
+        height: size of the health gauge in pixels"""
+        self.position = position
+        self.height = height
+        self.surface = pygame.Surface((height, height))
+        self.shown = None
+
+    def render(self, characteristics):
+        """Redraw the health gauge into the cached surface
+        characteristics: the hero's characteristics instance"""
+        ratio = characteristics.curr_health / characteristics.max_health
+        height = self.height
+        self.surface.fill((255, 255, 255))
+        curr_bar = pygame.Rect(5, 5 + (1-ratio) * (height - 10),
+                               height-10, ratio * (height - 10))
+        pygame.draw.rect(self.surface, (255, 0, 0), curr_bar)
+
+    def draw(self, surface, characteristics):
+        """Blit the HUD, re-rendering it first if the stats changed,
+        and returns the rect it covers
+        surface: the surface to draw on
+        characteristics: the hero's characteristics instance"""
+        if self.shown != (characteristics, characteristics.version):
+            self.render(characteristics)
+            self.shown = (characteristics, characteristics.version)
+        # the whole HUD rect, not what blit hands back, which is
+        # cut down to the surface's clip and can come back empty
+        surface.blit(self.surface, self.position)
+        return pygame.Rect(self.position, self.surface.get_size())
+
 
 # Game Class, for handling game loop eventually
 class RogueLike():
-    def __init__(self):
+    def __init__(self, bake_static=True, dirty_rects=False, event_driven=True, fps=60,
+                 profile="bigger", columns=20, rows=20, seed=None):
         """Initialize the roguelike game instance. Handles
         utility functions necessary for pygame and the
-        main game loop"""
+        main game loop
+        bake_static: draw walls, floors and doors from cached
+        chunk surfaces instead of tile by tile
+        dirty_rects: only redraw and push the screen regions
+        that changed instead of flipping the whole screen
+        event_driven: sleep until input arrives and only redraw
+        then, instead of rendering as fast as possible
+        fps: highest frame rate the game loop runs at, or None
+        for no cap
+        profile: name of the resolution profile to run at, see
+        render_target.PROFILES
+        columns: how many tiles wide each level is
+        rows: how many tiles tall each level is
+        seed: seed of the first level, each level after it
+        counting up from there. levels are random and are not
+        cached when left out, see bigger_map.Level"""
 
         pygame.init()
         pygame.mixer.init()
-        self.screen = pygame.display.set_mode((2048, 1224))
+        SOUNDS.preload()
+        self.profile = profile
+        self.columns = columns
+        self.rows = rows
+        self.seed = seed
+        self.depth = 0
+        self.target = RenderTarget(PROFILES[profile])
+        self.screen = self.target.surface
+        # read the screen images in while the level sets up
+        IMAGES.preload(SCREENS)
         self.clock = pygame.time.Clock()
+        self.bake_static = bake_static
+        self.dirty_rects = dirty_rects
+        self.event_driven = event_driven
+        self.fps = fps
+
+        # what the last frame showed, for finding dirty rects
+        self.last_view = None
+        self.last_sprites = {}
+        self.last_health = None
+        self.last_version = None
+        self.hud_rect = None
+        self.hud = HUD()
 
         # load the sprite image set
-        self.sprite_handler = SpriteHandler()
-        self.map = Map()
+        self.sprite_handler = SpriteHandler(self.target.tile_size)
+        # killed sprites, kept to be reused on the next level
+        self.pool = SpritePool()
+        self.map = Map(self.target.tile_size, self.columns, self.rows,
+                       seed=self.level_seed(self.depth))
+
+        # the next level is laid out on a worker thread while
+        # this one is played, see pregenerate
+        self.workers = ThreadPoolExecutor(max_workers=1)
+        self.next_level = None
 
         # define layers
         self.tile_layers = {
-            "TILE_WALL": pygame.sprite.Group(),
-            "TILE_FLOOR": pygame.sprite.Group(),
-            "TILE_HERO": pygame.sprite.Group(),
-            "TILE_DOOR": pygame.sprite.Group(),
-            "TILE_ITEM": pygame.sprite.Group(),
-            "TILE_ENEMY": pygame.sprite.Group()}
+            "TILE_WALL": TileGroup(),
+            "TILE_FLOOR": TileGroup(),
+            "TILE_HERO": TileGroup(),
+            "TILE_DOOR": TileGroup(),
+            "TILE_ITEM": TileGroup(),
+            "TILE_ENEMY": TileGroup()}
 
 
     def sprite_render(self):
-        """Reblit all sprites onto the main screen"""
+        """Reblit all sprites onto the main screen. In dirty rect
+        mode only the regions that changed since the last frame
+        are redrawn and pushed to the display, and nothing at all
+        when the frame is unchanged"""
+
+        self.screen = self.target.sync()
+
+        # center the viewport on the hero once per frame.
+        # this used to happen for every single tile, which
+        # made a frame cost tiles * layers group updates.
+        # sprites keep their rects up to date as they move
+        self.map.viewport_update(self.hero)
+        self.map.stream(self, self.hero.cell)
+
+        if self.dirty_rects:
+            dirty = self.dirty_regions()
+            if not dirty:
+                return
+            # keep drawing inside the changed area
+            self.target.window.set_clip(dirty[0].unionall(dirty[1:]))
+
+        self.draw_scene()
+
+        # write changes to screen
+        if self.dirty_rects:
+            self.target.window.set_clip(None)
+            self.target.present(dirty)
+        else:
+            self.target.present()
+
+    def draw_scene(self):
+        """Draw the level, its sprites and the HUD onto the screen"""
 
         # fill the screen with bg color
         self.screen.fill(pygame.Color(0, 0, 0))
 
-        # iterate through all tile layers,
-        # drawing the tile specified in sprite
-        # object locations
-        for layer in self.tile_layers:
-            for tile in self.tile_layers[layer]:
-                self.tile_layers["TILE_WALL"].update()
-                self.tile_layers["TILE_FLOOR"].update()
-                self.tile_layers["TILE_HERO"].update()
-                self.tile_layers["TILE_DOOR"].update()
-                self.tile_layers["TILE_ITEM"].update()
-                self.tile_layers["TILE_ENEMY"].update()
-                self.map.viewport_update(self.hero)
+        # static layers come from the map's baked chunks,
+        # leaving only the moving layers to draw by tile.
+        # otherwise the terrain on screen needs its sprites
+        layers = list(self.tile_layers)
+        if self.bake_static:
+            self.map.draw_static(self, self.screen)
+            layers = [layer for layer in layers if layer not in STATIC_LAYERS]
+        else:
+            self.map.materialize(self, self.screen.get_size())
+
+        # iterate through the remaining layers in order, drawing
+        # only the tiles that the map's index says are on
+        # screen, so the cost follows the screen size rather
+        # than the level size
+        size = self.screen.get_size()
+        for layer in layers:
+            for tile in self.map.visible_tiles(self.tile_layers[layer], size):
                 self.screen.blit(tile.tile, self.map.animator(tile))
-                self.display_health()
-
-        # write changes to screen
-        pygame.display.flip()
 
+        # scale the frame up to the window when it was composed
+        # at native resolution, then put the HUD on top of
+        # everything, once, at full window resolution
+        self.target.upscale()
+        self.hud_rect = self.display_health()
+
+    def dirty_regions(self):
+        """returns a list of the screen rects that changed since
+        the last frame: where the hero, enemies and items were and
+        now are, the cells on screen whose terrain changed, and the
+        HUD when the health changed. Scrolling or a new level
+        dirties the whole screen"""
+        size = self.screen.get_size()
+        sprites = {}
+        for layer in self.tile_layers:
+            if layer not in STATIC_LAYERS:
+                for tile in self.map.visible_tiles(self.tile_layers[layer], size):
+                    sprites[tile] = self.target.to_window(self.map.animator(tile))
+        view = (self.map.viewport.topleft, self.map.level)
+        health = (self.hero.characteristics, self.hero.characteristics.version)
+
+        if view != self.last_view:
+            dirty = [self.target.window.get_rect()]
+        else:
+            dirty = []
+            for tile in sprites:
+                if self.last_sprites.get(tile) != sprites[tile]:
+                    dirty.append(sprites[tile])
+            for tile in self.last_sprites:
+                if sprites.get(tile) != self.last_sprites[tile]:
+                    dirty.append(self.last_sprites[tile])
+            if health != self.last_health:
+                dirty.append(self.hud_rect)
+            if self.map.level.version != self.last_version:
+                xs, ys = self.map.visible_cells(size)
+                for cell in self.map.level.changed_cells(xs, ys, self.last_version):
+                    dirty.append(self.target.to_window(self.map.cell_rect(cell)))
+
+        self.last_view = view
+        self.last_version = self.map.level.version
+        self.last_sprites = sprites
+        self.last_health = health
+        return dirty
+
+    def redraw_all(self):
+        """Make the next dirty rect frame repaint the whole screen,
+        for when something else has drawn over it"""
+        self.last_view = None
 
     def display_health(self):
-        curr_health = self.hero.characteristics.curr_health
-        max_health = self.hero.characteristics.max_health
-        x_location = 10
-        y_location = 10
-        ratio = curr_health / max_health
-        height = 150
-        total_bar = pygame.Rect(x_location, y_location, height, height)
-        pygame.draw.rect(self.screen,(255, 255, 255), total_bar)
-        curr_bar = pygame.Rect(x_location + 5, y_location + 5 + (1-ratio) * (height - 10),
-                            height-10, ratio * (height - 10))
-        pygame.draw.rect(self.screen, (255, 0, 0), curr_bar)
-
+        """Draw the health gauge, returns the rect it covers"""
+        return self.hud.draw(self.target.window, self.hero.characteristics)
 
         """
         if curr_health<50:
@@ -90,12 +258,28 @@ class RogueLike():
             """
 
 
+    def level_seed(self, depth):
+        """returns the seed of a level, None for a random one
+        depth: how many levels came before it"""
+        if self.seed is None:
+            return None
+        return self.seed + depth
+
+    def pregenerate(self):
+        """Start laying out the next level on the worker thread,
+        so that going through a door only has to make sprites"""
+        level = Level(self.columns, self.rows, self.level_seed(self.depth + 1))
+        self.next_level = self.workers.submit(level.prepare)
+
     def generate_level(self):
-        """Delete all tiles in desired layer"""
+        """Delete all tiles in desired layer and switch over to the
+        level that was prepared in the background"""
 
         # fade in
         display_surface = pygame.display.set_mode((0, 0))
-        fade = pygame.image.load("./sprites/sprite_png/fade.png")
+        # a copy, so the alpha changes below don't stick to the
+        # surface the registry hands out next time
+        fade = IMAGES.get("fade.png").copy()
         display_surface.blit(fade, (0, 0))
         fade.set_alpha(0)  # make it completely transparent
 
@@ -103,14 +287,23 @@ class RogueLike():
             fade.set_alpha(i)
             pygame.display.flip()
 
+        # the hero is moved over by posReset, everything else
+        # goes back to the pool for the next level to reuse
         for layer in self.tile_layers:
             for tile in self.tile_layers[layer]:
-                tile.kill()
+                if layer == "TILE_HERO":
+                    tile.kill()
+                else:
+                    self.pool.release(tile)
 
         # characteristics = Characteristics(616,616,350,66,0,36,1.6, [])
         # self.hero = HeroSprite(self.tile_layers, self.sprite_handler, (10,10), characteristics)
-        self.hero.posReset((10, 10))
-        self.map = Map()
+        if self.next_level is None:
+            self.pregenerate()
+        self.depth += 1
+        self.map = Map(self.target.tile_size, self.columns, self.rows,
+                       self.next_level.result())
+        self.hero.posReset(self.map.start)
 
         for i in range(255):
             fade.set_alpha(255 - i)
@@ -118,23 +311,43 @@ class RogueLike():
 
         # place sprites/tiles
         self.map.generate(self)
+        self.pregenerate()
         self.display_health()
-
+        self.redraw_all()
+
+
+    def take_turn(self, delta):
+        """Move the hero one tile, then let the enemies move
+        delta: tuple with the x and y tiles to move the hero by"""
+        # collision handler changes reaction based on
+        # touched tile
+        self.hero.collisionHandler(self, delta)
+        # then every enemy near the hero gets its turn
+        self.map.enemy_turn(self, self.hero.cell)
+
+    def route_to(self, cell):
+        """returns the steps the hero takes to walk to a cell, empty
+        when there is no way there that is laid out yet
+        cell: tuple with the x and y tile coordinate"""
+        path = self.map.level.paths.path(self.hero.cell, cell)
+        if path is None:
+            return []
+        return [(b[0] - a[0], b[1] - a[1]) for a, b in zip(path, path[1:])]
 
     def gameloop(self):
         """Run the main game loop"""
 
         # place map related tiles
         self.map.generate(self)
+        self.pregenerate()
 
         # create the hero!
         characteristics = Characteristics(616,616,350, 350, 66,0,36,1.6, [])
-        self.hero = HeroSprite(self.tile_layers, self.sprite_handler, (10, 10), characteristics)
-        deadmau = pygame.image.load('./sprites/sprite_png/deadmau.png')
+        self.hero = HeroSprite(self.tile_layers, self.sprite_handler, self.map.start, characteristics)
         # starts the game
         start = True
+        startscreen = IMAGES.get("startscreen.png")
         while start:
-            startscreen = pygame.image.load('./sprites/sprite_png/startscreen.png')
             display_surface = pygame.display.set_mode((0, 0))
             display_surface.blit(startscreen, (0, 0))
             pygame.display.update()
@@ -147,16 +360,16 @@ class RogueLike():
                     intro = True
         # introduction screen
         current_image = 0
-        introwords1 = pygame.image.load("./sprites/sprite_png/storywords1.png")
-        introwords2 = pygame.image.load("./sprites/sprite_png/storywords2.png")
-        introwords3 = pygame.image.load("./sprites/sprite_png/storywords3.png")
-        introwords4 = pygame.image.load("./sprites/sprite_png/storywords4.png")
-        intropic1 = pygame.image.load("./sprites/sprite_png/intro1.png")
-        intropic2 = pygame.image.load("./sprites/sprite_png/intro2.png")
-        intropic3 = pygame.image.load("./sprites/sprite_png/intro3.png")
-        intropic4 = pygame.image.load("./sprites/sprite_png/intro4.png")
-        instructions = pygame.image.load("./sprites/sprite_png/instructions.png")
-        itemguide = pygame.image.load("./sprites/sprite_png/itemguide.png")
+        introwords1 = IMAGES.get("storywords1.png")
+        introwords2 = IMAGES.get("storywords2.png")
+        introwords3 = IMAGES.get("storywords3.png")
+        introwords4 = IMAGES.get("storywords4.png")
+        intropic1 = IMAGES.get("intro1.png")
+        intropic2 = IMAGES.get("intro2.png")
+        intropic3 = IMAGES.get("intro3.png")
+        intropic4 = IMAGES.get("intro4.png")
+        instructions = IMAGES.get("instructions.png")
+        itemguide = IMAGES.get("itemguide.png")
         introorder = [introwords1, intropic1, introwords2, intropic2, introwords3, intropic3, introwords4, intropic4
                 , instructions, itemguide]
 
@@ -175,21 +388,46 @@ class RogueLike():
                 run = True
         # run the game loop until program is quit
         dead = False
+        winner = False
+        redraw = True
+        # steps left of a click to move or a walk to the door,
+        # taken one every ROUTE_STEP_MS
+        route = []
+        next_step = 0
+        # nothing reacts to the mouse moving, so don't let it wake
+        # the event driven loop up
+        if self.event_driven:
+            pygame.event.set_blocked(pygame.MOUSEMOTION)
+        # drop the clicks left over from the intro screens, so the
+        # release of the last one isn't taken as a click to move
+        pygame.event.clear()
         while run:
-            # fetch all events such as keypressed
-            events = pygame.event.get()
+            # fetch all events such as keypressed. the game is
+            # turn based, so when there's nothing new to show
+            # we block until something happens instead of
+            # spinning through frames that look the same
+            if self.event_driven and not redraw:
+                timeout = ROUTE_STEP_MS if route else IDLE_TIMEOUT
+                events = [pygame.event.wait(timeout)] + pygame.event.get()
+            else:
+                events = pygame.event.get()
+            delta = None
             for event in events:
+                # a wait that timed out hands back an empty event
+                if event.type not in REDRAW_EVENTS:
+                    continue
+                redraw = True
                 if event.type == pygame.QUIT:
                     run = False
                 if event.type == pygame.KEYDOWN:
                     # print the health on every turn
                     #self.hero.characteristics.print_health()
 
-                    # collision handler changes reaction based on
-                    # touched tile. Delta change according to
-                    # the direction pressed and is the desired
-                    # movement in units of tiles
+                    # any key takes over from a route. Delta change
+                    # according to the direction pressed and is the
+                    # desired movement in units of tiles
                     #move_sound.play()
+                    route = []
                     if event.key == pygame.K_LEFT:
                         delta = (-1, 0)
                     if event.key == pygame.K_RIGHT:
@@ -198,25 +436,54 @@ class RogueLike():
                         delta = (0, -1)
                     if event.key == pygame.K_DOWN:
                         delta = (0, 1)
-                    self.hero.collisionHandler(self, delta)
+                    # t travels to the door once it has been found
+                    if event.key == pygame.K_t:
+                        door = self.map.level.find_door()
+                        if door is not None:
+                            route = self.route_to(door)
+                            next_step = pygame.time.get_ticks()
+                if event.type == pygame.MOUSEBUTTONUP:
+                    # click to move to the tile under the mouse
+                    route = self.route_to(self.map.cell_at(self.target.to_frame(event.pos)))
+                    next_step = pygame.time.get_ticks()
+                if delta is not None:
+                    self.take_turn(delta)
+                    delta = None
                     winner = self.hero.door_counter == 2
-
                     # quit the game when the hero's health is 0
                     dead = self.hero.characteristics.curr_health <= 0
-                    if dead:
-                        run = False
-                    if winner:
+                    if dead or winner:
                         run = False
-            self.sprite_render()
+                        route = []
+                        break
+            if route and pygame.time.get_ticks() >= next_step:
+                step = route.pop(0)
+                expected = (self.hero.x + step[0], self.hero.y + step[1])
+                self.take_turn(step)
+                next_step = pygame.time.get_ticks() + ROUTE_STEP_MS
+                redraw = True
+                # stop walking when something got in the way, like
+                # an enemy the hero fought instead of stepping
+                if self.hero.cell != expected:
+                    route = []
+                winner = self.hero.door_counter == 2
+                dead = self.hero.characteristics.curr_health <= 0
+                if dead or winner:
+                    run = False
+            if redraw or not self.event_driven:
+                self.sprite_render()
+                redraw = False
+            if self.fps:
+                self.clock.tick(self.fps)
         if dead:
             print("dead")
-            deadmau = pygame.image.load('./sprites/sprite_png/deadmau.png')
+            deadmau = IMAGES.get("deadmau.png")
             display_surface = pygame.display.set_mode((0, 0))
             display_surface.blit(deadmau, (0, 0))
             pygame.display.update()
         if winner:
             print("winner")
-            deadneko = pygame.image.load('./sprites/sprite_png/scaledwinner.png')
+            deadneko = IMAGES.get("scaledwinner.png")
             display_surface = pygame.display.set_mode((0, 0))
             display_surface.blit(deadneko, (0, 0))
             pygame.display.update()
@@ -239,7 +506,14 @@ class RogueLike():
         if revive:
             pygame.quit()
             print("revived")
-            RogueLike().gameloop()
+            RogueLike(bake_static=self.bake_static,
+                      dirty_rects=self.dirty_rects,
+                      event_driven=self.event_driven,
+                      fps=self.fps,
+                      profile=self.profile,
+                      columns=self.columns,
+                      rows=self.rows,
+                      seed=self.seed).gameloop()
 
 if __name__ == "__main__":
     # create the main object and run the loop function
@@ -1,18 +1,652 @@
 import pygame
 import bigger_sprite as sprite
 from bigger_sprite import *
+import heapq
+import os
 import random
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import ecs
+from ecs import Components
+import combat_sim
+
+# layers that never move once a level is generated, so they
+# can be composited once into chunk surfaces instead of being
+# blitted tile by tile every frame
+STATIC_LAYERS = ["TILE_WALL", "TILE_FLOOR", "TILE_DOOR"]
+# chunk edge length in tiles, and how many baked chunks to keep
+CHUNK_TILES = 4
+CHUNK_CACHE_SIZE = 16
+# levels are generated in square chunks of this many tiles,
+# and only once the hero comes within STREAM_RADIUS tiles
+# of them, so a huge level costs no more to enter than a
+# small one
+STREAM_CHUNK = 16
+STREAM_RADIUS = 12
+# enemies within this many tiles of the hero chase it. kept
+# inside STREAM_RADIUS, so every chaser already has a sprite
+CHASE_RADIUS = 10
+# distance field value for cells that can't be reached
+UNREACHABLE = np.iinfo(np.int32).max
+# the four directions anything can step in, as dx, dy rows
+STEPS = np.array([(1, 0), (-1, 0), (0, 1), (0, -1)])
+# how many flow fields and paths the pathfinder keeps around
+FIELD_CACHE_SIZE = 16
+PATH_CACHE_SIZE = 64
+
+# terrain flags for a level cell. a door can sit on top
+# of a floor, so a cell holds any combination of them
+EMPTY = 0
+FLOOR = 1
+WALL = 2
+DOOR = 4
+
+# seeded levels are saved here once laid out, so replaying a
+# seed loads the arrays instead of generating them again. bump
+# GENERATOR_VERSION whenever generation changes, which leaves
+# the old layouts behind
+LEVEL_CACHE_DIR = "level_cache"
+# writes level cache files off the thread that laid the level
+# out, one at a time so two saves never share a temporary file
+CACHE_WRITER = ThreadPoolExecutor(max_workers=1)
+# the last write submitted for each cache file, so a load can
+# wait for it instead of missing a file that is on its way
+CACHE_WRITES = {}
+GENERATOR_VERSION = 2
+
+# components every enemy entity has, and what a new enemy starts with
+ENEMY_COMPONENTS = {"position": (np.int32, (2,)), "curr_health": np.float64,
+                    "max_health": np.float64, "atk": np.float64,
+                    "true_damage": np.float64, "armor": np.float64, "spd": np.float64}
+ENEMY_STATS = {"curr_health": 616, "max_health": 616, "atk": 66,
+               "true_damage": 0, "armor": 36, "spd": 1.6}
+
+class TileGroup(pygame.sprite.Group):
+    """Sprite group that also keeps a spatial index from
+    integer tile coordinate to the sprites on that tile,
+    so finding what sits at a location doesn't mean
+    scanning the whole group"""
+
+    def __init__(self, *sprites):
+        """Create a new, indexed group
+        sprites: any sprites to add right away"""
+        self.cells = {}
+        self.where = {}
+        pygame.sprite.Group.__init__(self, *sprites)
+
+    @staticmethod
+    def cell(tile):
+        """returns the integer tile coordinate of a sprite
+        tile: the sprite object to locate"""
+        return tile.x, tile.y
+
+    def add_internal(self, sprite, *args):
+        """index the sprite as it joins the group"""
+        pygame.sprite.Group.add_internal(self, sprite, *args)
+        cell = self.cell(sprite)
+        self.cells.setdefault(cell, []).append(sprite)
+        self.where[sprite] = cell
+
+    def remove_internal(self, sprite):
+        """drop the sprite from the index as it leaves the group"""
+        pygame.sprite.Group.remove_internal(self, sprite)
+        cell = self.where.pop(sprite)
+        self.cells[cell].remove(sprite)
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def relocate(self, sprite):
+        """move a sprite to the right cell after its position changed
+        sprite: a sprite in this group"""
+        if sprite in self.where:
+            self.remove_internal(sprite)
+            self.add_internal(sprite)
+
+    def at(self, cell):
+        """returns the sprites sitting on a tile
+        cell: tuple with the integer x and y tile coordinate"""
+        return self.cells.get(cell, [])
+
+
+class Level:
+    """Array backed description of a level, kept apart from
+    the pygame sprites that show it. Terrain, enemies and
+    items each live in a NumPy array indexed [x + 1, y + 1],
+    so the ring of walls around the level fits in too"""
+
+    def __init__(self, columns=20, rows=20, seed=None):
+        """Create a new, empty level
+        columns: how many tiles wide the level is
+        rows: how many tiles tall the level is
+        seed: number the layout is generated from, the same
+        seed always giving the same level. picked at random,
+        and not cached, when left out"""
+        self.columns = columns
+        self.rows = rows
+        self.start = (columns // 2, rows // 2)
+        self.cached = seed is not None
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+
+        shape = (columns + 2, rows + 2)
+        # terrain flags for every cell
+        self.terrain = np.zeros(shape, dtype=np.uint8)
+        # enemy entity ID for every cell, 0 where there is none
+        self.entities = np.zeros(shape, dtype=np.int32)
+        # item ID for every cell, 0 where there is none
+        self.items = np.zeros(shape, dtype=np.int8)
+        # the enemies' positions and stats, by entity ID
+        self.enemies = Components(ENEMY_COMPONENTS)
+
+        # which generation chunks have been laid out so far
+        self.generated = np.zeros((-(-(columns + 2) // STREAM_CHUNK),
+                                   -(-(rows + 2) // STREAM_CHUNK)), dtype=bool)
+
+        # bumped whenever the terrain changes, so anything
+        # drawn from it can tell it has gone stale, along with
+        # the version each cell last changed at, so anything
+        # worked out from a part of the level can tell if that
+        # part changed
+        self.version = 0
+        self.changed_at = np.zeros(shape, dtype=np.int32)
+
+        # cached paths and distance fields over this level
+        self.paths = Pathfinder(self)
+
+        # where the door goes, known from the seed alone so a
+        # level read from the level cache has it too
+        self.door = self.pick_door()
+
+    def index(self, cell):
+        """returns the array index of a tile coordinate
+        cell: tuple with the x and y tile coordinate"""
+        return cell[0] + 1, cell[1] + 1
+
+    def inside(self, cell):
+        """returns if a tile coordinate is part of the level arrays
+        cell: tuple with the x and y tile coordinate"""
+        return -1 <= cell[0] <= self.columns and -1 <= cell[1] <= self.rows
+
+    def terrain_at(self, cell):
+        """returns the terrain flags of a cell, EMPTY outside the level
+        cell: tuple with the x and y tile coordinate"""
+        if not self.inside(cell):
+            return EMPTY
+        return self.terrain[self.index(cell)]
+
+    def is_wall(self, cell):
+        """returns if a cell has a wall on it
+        cell: tuple with the x and y tile coordinate"""
+        return bool(self.terrain_at(cell) & WALL)
+
+    def is_door(self, cell):
+        """returns if a cell has a door on it
+        cell: tuple with the x and y tile coordinate"""
+        return bool(self.terrain_at(cell) & DOOR)
+
+    def add_terrain(self, cell, flags):
+        """Put terrain on a cell
+        cell: tuple with the x and y tile coordinate
+        flags: terrain flags to add"""
+        self.terrain[self.index(cell)] |= flags
+        self.version += 1
+        self.changed_at[self.index(cell)] = self.version
+
+    def add_item(self, cell, item_id):
+        """Put an item on a cell, on top of a floor
+        cell: tuple with the x and y tile coordinate
+        item_id: number identifying the kind of item"""
+        self.items[self.index(cell)] = item_id
+        self.add_terrain(cell, FLOOR)
+
+    def add_enemy(self, cell):
+        """Put a new enemy on a cell, on top of a floor
+        returns the enemy's entity ID
+        cell: tuple with the x and y tile coordinate"""
+        entity_id = self.enemies.spawn(position=cell, **ENEMY_STATS)
+        self.entities[self.index(cell)] = entity_id
+        self.add_terrain(cell, FLOOR)
+        return entity_id
+
+    def remove_item(self, cell):
+        """Clear a picked up item off a cell
+        cell: tuple with the x and y tile coordinate"""
+        self.items[self.index(cell)] = 0
+
+    def remove_enemy(self, cell):
+        """Clear a dead enemy off a cell
+        cell: tuple with the x and y tile coordinate"""
+        self.enemies.kill(self.entities[self.index(cell)])
+        self.entities[self.index(cell)] = 0
+
+    def changed_cells(self, xs, ys, version):
+        """returns the tile coordinates of the cells in a block
+        whose terrain changed after a level version
+        xs: range of x tile coordinates
+        ys: range of y tile coordinates
+        version: level version to compare against"""
+        region = (slice(max(xs.start + 1, 0), max(xs.stop + 1, 0)),
+                  slice(max(ys.start + 1, 0), max(ys.stop + 1, 0)))
+        changed = np.argwhere(self.changed_at[region] > version)
+        return [(int(x) + region[0].start - 1, int(y) + region[1].start - 1)
+                for x, y in changed]
+
+    def fight(self, characteristics, cells):
+        """Have the hero attack the enemies on some cells all at
+        once, with the ecs.attack combat system, and clear the
+        ones it kills off the level
+        returns the damage the hero takes
+        characteristics: the hero's Characteristics instance
+        cells: list of tile coordinates with enemies on them"""
+        ids = np.array([self.entities[self.index(cell)] for cell in cells])
+        taken, dead = ecs.attack(self.enemies, ids, combat_sim.stat_block([characteristics]))
+        for x, y in self.enemies["position"][dead].tolist():
+            self.remove_enemy((x, y))
+        return float(taken.sum())
+
+    def distance_field(self, cell, radius):
+        """returns how many steps every cell in a square window
+        around a cell is from it, walking over floor that isn't a
+        door or wall, and the window's array index slices. Grown
+        one step at a time over the whole window at once, so the
+        cost doesn't depend on how many enemies use it
+        cell: tuple with the x and y tile coordinate to measure from
+        radius: half the window's edge length in tiles"""
+        cx, cy = self.index(cell)
+        window = (slice(max(cx - radius, 0), min(cx + radius + 1, self.terrain.shape[0])),
+                  slice(max(cy - radius, 0), min(cy + radius + 1, self.terrain.shape[1])))
+        terrain = self.terrain[window]
+        passable = ((terrain & FLOOR) != 0) & ((terrain & (WALL | DOOR)) == 0)
+
+        distance = np.full(terrain.shape, UNREACHABLE, dtype=np.int32)
+        frontier = np.zeros(terrain.shape, dtype=bool)
+        frontier[cx - window[0].start, cy - window[1].start] = True
+        distance[frontier] = 0
+        steps = 0
+        while frontier.any():
+            steps += 1
+            grown = np.zeros(terrain.shape, dtype=bool)
+            grown[1:, :] |= frontier[:-1, :]
+            grown[:-1, :] |= frontier[1:, :]
+            grown[:, 1:] |= frontier[:, :-1]
+            grown[:, :-1] |= frontier[:, 1:]
+            frontier = grown & passable & (distance == UNREACHABLE)
+            distance[frontier] = steps
+        return distance, window
+
+    def enemy_turn(self, hero_cell):
+        """Step every enemy near the hero one tile closer to it, all
+        at once, down one shared distance field. Enemies next to the
+        hero stay put, and an enemy can't step onto a tile another
+        one is on or has already claimed this turn
+        returns an array of x, y, dx, dy rows for the enemies that moved
+        hero_cell: tuple with the hero's x and y tile coordinate"""
+        distance, window = self.paths.flow_field(hero_cell, CHASE_RADIUS)
+        entities = self.entities[window]
+        ex, ey = np.nonzero((entities != 0) & (distance != UNREACHABLE) & (distance > 1))
+        if len(ex) == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+
+        # the distance of each neighbour, in STEPS order
+        padded = np.pad(distance, 1, constant_values=UNREACHABLE)
+        around = np.stack([padded[ex + 1 + dx, ey + 1 + dy] for dx, dy in STEPS], axis=1)
+        best = around.argmin(axis=1)
+        downhill = around[np.arange(len(ex)), best] < distance[ex, ey]
+        ids = entities[ex, ey][downhill]
+        deltas = STEPS[best[downhill]]
+
+        starts = self.enemies["position"][ids].copy()
+        moved = ecs.move(self.enemies, ids, deltas,
+                         lambda cells: self.entities[cells[:, 0] + 1, cells[:, 1] + 1] != 0)
+        moved = np.isin(ids, moved)
+        starts, deltas, ids = starts[moved], deltas[moved], ids[moved]
+        self.entities[starts[:, 0] + 1, starts[:, 1] + 1] = 0
+        ends = starts + deltas
+        self.entities[ends[:, 0] + 1, ends[:, 1] + 1] = ids
+        return np.concatenate([starts, deltas], axis=1)
+
+    def prepare(self):
+        """Place the door and lay out the chunks around the start,
+        everything needed before the hero can walk in. Touches no
+        pygame state, so it can run on a worker thread"""
+        self.lay_out(self.chunks_near(self.start, STREAM_RADIUS))
+        return self
+
+    def lay_out(self, chunks):
+        """Generate a fresh level's door and chunks, reading them
+        from the level cache when the seed was laid out before
+        and saving anything new back to it
+        chunks: list of chunk coordinates that have to be ready"""
+        if not self.generated.any() and not self.load():
+            self.place_door()
+        missing = [chunk for chunk in chunks if not self.generated[chunk]]
+        for chunk in missing:
+            self.generate_chunk(chunk)
+        if missing:
+            self.save()
+
+    def cache_path(self):
+        """returns the level cache file for this seed and size"""
+        return os.path.join(LEVEL_CACHE_DIR, "v%d-%d-%dx%d.npz"
+                            % (GENERATOR_VERSION, self.seed, self.columns, self.rows))
+
+    def load(self):
+        """Read the level arrays from the level cache
+        returns if the seed was found there"""
+        if not self.cached:
+            return False
+        if self.cache_path() in CACHE_WRITES:
+            CACHE_WRITES[self.cache_path()].result()
+        if not os.path.exists(self.cache_path()):
+            return False
+        with np.load(self.cache_path()) as saved:
+            self.terrain = saved["terrain"]
+            self.entities = saved["entities"]
+            self.items = saved["items"]
+            self.generated = saved["generated"]
+            self.enemies.load({name[len("enemy_"):]: saved[name] for name in saved.files
+                               if name.startswith("enemy_")})
+        self.version += 1
+        self.changed_at[:] = self.version
+        return True
+
+    def save(self):
+        """Write the level arrays to the level cache. The arrays
+        are copied as they are now and compressed on CACHE_WRITER,
+        so saving doesn't hold up the level being entered
+        returns the Future of the write, None when not cached"""
+        if not self.cached:
+            return None
+        arrays = {"terrain": self.terrain, "entities": self.entities,
+                  "items": self.items, "generated": self.generated}
+        arrays.update({"enemy_" + name: array for name, array in self.enemies.state().items()})
+        arrays = {name: array.copy() for name, array in arrays.items()}
+        write = CACHE_WRITER.submit(write_level_cache, self.cache_path(), arrays)
+        CACHE_WRITES[self.cache_path()] = write
+        return write
+
+    def rng(self, *key):
+        """returns a random generator for one part of the level,
+        so every part comes out the same whatever order the
+        hero walks the level in
+        key: numbers naming the part"""
+        return random.Random(":".join(str(k) for k in (self.seed,) + key))
+
+    def pick_door(self):
+        """returns the tile coordinate for the level's one door,
+        somewhere other than the start"""
+        rng = self.rng("door")
+        while True:
+            x = rng.randint(0, self.columns)
+            y = rng.randint(0, self.rows)
+            if not (x, y) == self.start:
+                return x, y
+
+    def place_door(self):
+        """Put the level's one door on the terrain"""
+        self.add_terrain(self.door, DOOR)
+
+    def chunk_cells(self, chunk):
+        """returns the ranges of x and y tile coordinates that a
+        generation chunk covers, including any of the wall ring
+        chunk: tuple with the x and y chunk coordinate"""
+        return (range(chunk[0] * STREAM_CHUNK - 1,
+                      min((chunk[0] + 1) * STREAM_CHUNK, self.columns + 2) - 1),
+                range(chunk[1] * STREAM_CHUNK - 1,
+                      min((chunk[1] + 1) * STREAM_CHUNK, self.rows + 2) - 1))
+
+    def chunks_near(self, cell, radius):
+        """returns the generation chunks within a distance of a cell
+        cell: tuple with the x and y tile coordinate
+        radius: distance in tiles"""
+        chunks = []
+        for cx in range(max(0, (cell[0] - radius + 1) // STREAM_CHUNK),
+                        min(self.generated.shape[0], (cell[0] + radius + 1) // STREAM_CHUNK + 1)):
+            for cy in range(max(0, (cell[1] - radius + 1) // STREAM_CHUNK),
+                            min(self.generated.shape[1], (cell[1] + radius + 1) // STREAM_CHUNK + 1)):
+                chunks.append((cx, cy))
+        return chunks
+
+    def generate_chunk(self, chunk):
+        """Randomly lay out floors, items and enemies for one chunk,
+        then close it off with walls. Does nothing for a chunk that
+        was already generated
+        chunk: tuple with the x and y chunk coordinate"""
+        if self.generated[chunk]:
+            return
+        self.generated[chunk] = True
+        rng = self.rng(*chunk)
+        xs, ys = self.chunk_cells(chunk)
+        # the wall ring is never floor
+        xs = [x for x in xs if 0 <= x < self.columns]
+        ys = [y for y in ys if 0 <= y < self.rows]
+
+        # randomly place floors
+        for x in xs:
+            for y in ys:
+                if rng.random() > 0.2:
+                    self.add_terrain((x, y), FLOOR)
+        if self.start[0] in xs and self.start[1] in ys:
+            self.add_terrain(self.start, FLOOR)
+
+        # randomly place items, by item ID, see bigger_sprite.ITEMS
+        for x in xs:
+            for y in ys:
+                if rng.random() < 0.09 and not (x, y) == self.start:
+                    self.add_item((x, y), rng.randint(0, 2) + 1)
+
+        # randomly place enemies
+        for x in xs:
+            for y in ys:
+                if rng.random() < 0.02 and not (x, y) == self.start:
+                    self.add_enemy((x, y))
+
+        # place walls wherever there isn't a floor
+        self.place_walls(chunk)
+
+    def chunk_of(self, cell):
+        """returns the generation chunk a cell is in
+        cell: tuple with the x and y tile coordinate"""
+        x, y = self.index(cell)
+        return x // STREAM_CHUNK, y // STREAM_CHUNK
+
+    def chunk_slice(self, chunk):
+        """returns the array index slices of a generation chunk
+        chunk: tuple with the x and y chunk coordinate"""
+        return (slice(chunk[0] * STREAM_CHUNK, (chunk[0] + 1) * STREAM_CHUNK),
+                slice(chunk[1] * STREAM_CHUNK, (chunk[1] + 1) * STREAM_CHUNK))
+
+    def place_walls(self, chunk):
+        """Place walls on every empty cell of a chunk except the
+        start, as one mask over the chunk's part of the terrain
+        array, so a chunk costs the same however big the level is
+        chunk: tuple with the x and y chunk coordinate"""
+        region = self.chunk_slice(chunk)
+        terrain = self.terrain[region]
+        empty = terrain == EMPTY
+        sx, sy = self.index(self.start)
+        if (region[0].start <= sx < region[0].stop
+                and region[1].start <= sy < region[1].stop):
+            empty[sx - region[0].start, sy - region[1].start] = False
+        terrain[empty] = WALL
+        self.version += 1
+        self.changed_at[region][empty] = self.version
+
+    def find_door(self):
+        """returns the tile coordinate of the door, or None when
+        it is in a part of the level that isn't laid out yet"""
+        if not self.generated[self.chunk_of(self.door)]:
+            return None
+        return self.door
+
+
+def write_level_cache(path, arrays):
+    """Write level arrays to a level cache file
+    path: the file to write, see Level.cache_path
+    arrays: dictionary of array name to array"""
+    os.makedirs(LEVEL_CACHE_DIR, exist_ok=True)
+    # write next to it and swap it in, so a half written
+    # file is never picked up
+    with open(path + ".tmp", "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+class Pathfinder:
+    """Paths and distance fields over a level, kept until the
+    terrain they cross changes. A* finds the way for one walker,
+    distance fields lead any number of walkers to one target"""
+
+    def __init__(self, level):
+        """Create a new pathfinder
+        level: the Level to find paths through"""
+        self.level = level
+        # keyed by target and radius, the version the field was
+        # checked at, its window and the field itself
+        self.fields = OrderedDict()
+        # keyed by start and goal, the version the path was
+        # checked at and the path itself
+        self.routes = OrderedDict()
+
+    def unchanged(self, region, version):
+        """returns if no cell in part of the level changed since
+        a version
+        region: index into the level arrays
+        version: level version to compare against"""
+        changed = self.level.changed_at[region]
+        return changed.size == 0 or changed.max() <= version
+
+    def flow_field(self, target, radius):
+        """returns the distance field toward a target and its window,
+        see Level.distance_field. Reused until a cell in the window
+        changes, however many walkers use it or turns go by
+        target: tuple with the x and y tile coordinate
+        radius: half the window's edge length in tiles"""
+        key = (target, radius)
+        if key in self.fields:
+            version, window, distance = self.fields[key]
+            if version == self.level.version or self.unchanged(window, version):
+                self.fields[key] = (self.level.version, window, distance)
+                self.fields.move_to_end(key)
+                return distance, window
+        distance, window = self.level.distance_field(target, radius)
+        self.fields[key] = (self.level.version, window, distance)
+        self.fields.move_to_end(key)
+        if len(self.fields) > FIELD_CACHE_SIZE:
+            self.fields.popitem(last=False)
+        return distance, window
+
+    def walkable(self, cell, goal):
+        """returns if a path can go over a cell, which is any floor
+        that isn't walled off. A door only counts when it is the
+        goal, since stepping on one ends the level
+        cell: tuple with the x and y tile coordinate
+        goal: tuple with the x and y tile coordinate of the goal"""
+        flags = self.level.terrain_at(cell)
+        if flags & WALL:
+            return False
+        if flags & DOOR:
+            return cell == goal
+        return bool(flags & FLOOR)
+
+    def path(self, start, goal):
+        """returns the list of cells from start to goal, both ends
+        included, or None when the goal can't be reached. Found
+        with A*, and reused as long as no cell on it changes. Not
+        finding one is reused until anything in the level changes
+        start: tuple with the x and y tile coordinate to leave from
+        goal: tuple with the x and y tile coordinate to get to"""
+        key = (start, goal)
+        if key in self.routes:
+            version, path = self.routes[key]
+            if version == self.level.version or path is not None and self.unchanged(
+                    tuple(np.array(path).T + 1), version):
+                self.routes[key] = (self.level.version, path)
+                self.routes.move_to_end(key)
+                return path
+
+        path = self.astar(start, goal)
+        self.routes[key] = (self.level.version, path)
+        self.routes.move_to_end(key)
+        if len(self.routes) > PATH_CACHE_SIZE:
+            self.routes.popitem(last=False)
+        return path
+
+    def astar(self, start, goal):
+        """returns the shortest list of cells from start to goal,
+        or None when there isn't one. Only walks the parts of the
+        level that are laid out, so the search stays near the hero
+        start: tuple with the x and y tile coordinate to leave from
+        goal: tuple with the x and y tile coordinate to get to"""
+        if not self.walkable(goal, goal):
+            return None
+        came_from = {start: None}
+        cost = {start: 0}
+        # ordered by cost so far plus the manhattan distance left,
+        # the counter breaks ties in the order cells were found
+        queue = [(abs(goal[0] - start[0]) + abs(goal[1] - start[1]), 0, start)]
+        found = 0
+        while queue:
+            _, _, cell = heapq.heappop(queue)
+            if cell == goal:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = came_from[cell]
+                return path[::-1]
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                step = (cell[0] + dx, cell[1] + dy)
+                if step not in cost or cost[cell] + 1 < cost[step]:
+                    if not self.walkable(step, goal):
+                        continue
+                    cost[step] = cost[cell] + 1
+                    came_from[step] = cell
+                    found += 1
+                    estimate = cost[step] + abs(goal[0] - step[0]) + abs(goal[1] - step[1])
+                    heapq.heappush(queue, (estimate, found, step))
+        return None
+
 
 # Map Generator Class, for randomly generating a map
 # or for a constant map!
 class Map:
-    def __init__(self):
-        """Create a new handler for map related interactions"""
-        self.viewport = pygame.Rect(0, 0, 1024, 1024)
-        self.width = 1024
-        self.height = 1024
-        self.xset = int((1024 - 256) / 2)
-        self.yset = int((1024 - 256) / 2)
+    def __init__(self, tile_size=256, columns=20, rows=20, level=None, seed=None):
+        """Create a new handler for map related interactions
+        tile_size: size of a tile in pixels on the frame surface
+        columns: how many tiles wide the level is
+        rows: how many tiles tall the level is
+        level: an already prepared Level to use, or None for
+        a new one of the given size
+        seed: seed for a new level, see Level"""
+        # the viewport is four tiles across, with the hero
+        # kept in the middle of it
+        self.tile_size = tile_size
+        self.width = 4 * tile_size
+        self.height = 4 * tile_size
+        self.viewport = pygame.Rect(0, 0, self.width, self.height)
+        self.xset = int((self.width - self.tile_size) / 2)
+        self.yset = int((self.height - self.tile_size) / 2)
+
+        # the level data, and the cell the hero starts on
+        if level is None:
+            level = Level(columns, rows, seed)
+        self.level = level
+        self.start = self.level.start
+
+        # generation chunks whose items and enemies have sprites
+        self.spawned = set()
+
+        # floor, wall and door sprites only exist for the cells
+        # on screen, keyed by cell, along with the level version
+        # they were last checked against
+        self.materialized = {}
+        self.materialized_version = self.level.version
+
+        # baked static layer chunks, least recently drawn first,
+        # each with the level version it was baked from
+        self.chunks = OrderedDict()
 
     def animator(self, tile):
         """Moves tiles according to the top left of the view port
@@ -31,59 +665,159 @@ class Map:
         self.viewport.x = -tile.rect.x + self.xset
         self.viewport.y = -tile.rect.y + self.xset
 
+    def cell_rect(self, cell):
+        """returns the rect a cell covers on screen
+        cell: tuple with the x and y tile coordinate"""
+        return pygame.Rect(cell[0] * self.tile_size + self.viewport.x,
+                           cell[1] * self.tile_size + self.viewport.y,
+                           self.tile_size, self.tile_size)
+
+    def cell_at(self, point):
+        """returns the tile coordinate under a point on screen
+        point: tuple with the x and y pixel on the frame surface"""
+        return ((point[0] - self.viewport.x) // self.tile_size,
+                (point[1] - self.viewport.y) // self.tile_size)
+
+    def visible_cells(self, surface_size):
+        """returns the range of tile coordinates that the screen
+        shows with the current viewport, as two ranges for x and y
+        surface_size: tuple with the width and height of the screen"""
+        left = -self.viewport.x
+        top = -self.viewport.y
+        return (range(left // self.tile_size, (left + surface_size[0] - 1) // self.tile_size + 1),
+                range(top // self.tile_size, (top + surface_size[1] - 1) // self.tile_size + 1))
+
+    def visible_tiles(self, group, surface_size):
+        """returns only the sprites of a group that land on screen,
+        looked up through the group's tile index instead of checking
+        every sprite in the level
+        group: TileGroup to cull
+        surface_size: tuple with the width and height of the screen"""
+        xs, ys = self.visible_cells(surface_size)
+        tiles = []
+        for x in xs:
+            for y in ys:
+                tiles.extend(group.at((x, y)))
+        return tiles
+
+    def materialize(self, rogue, surface_size):
+        """Make floor, wall and door sprites for the cells on screen
+        from the level's terrain, and kill the ones that went out of
+        view. Only needed when the static layers are drawn as sprites
+        rogue: the roguelike game instance
+        surface_size: tuple with the width and height of the screen"""
+        xs, ys = self.visible_cells(surface_size)
+        visible = {(x, y) for x in xs for y in ys}
+        # only the cells whose terrain changed need new sprites
+        if self.materialized_version != self.level.version:
+            for cell in self.level.changed_cells(xs, ys, self.materialized_version):
+                for tile in self.materialized.pop(cell, []):
+                    rogue.pool.release(tile)
+            self.materialized_version = self.level.version
+        for cell in list(self.materialized):
+            if cell not in visible:
+                for tile in self.materialized.pop(cell):
+                    rogue.pool.release(tile)
+        for cell in visible:
+            if cell not in self.materialized:
+                flags = self.level.terrain_at(cell)
+                tiles = []
+                for flag, sprite_class in ((WALL, WallSprite), (FLOOR, FloorSprite), (DOOR, DoorSprite)):
+                    if flags & flag:
+                        tiles.append(rogue.pool.take(sprite_class, rogue.tile_layers,
+                                                     rogue.sprite_handler, cell))
+                self.materialized[cell] = tiles
+
+    def bake_chunk(self, rogue, chunk):
+        """returns a surface with the terrain of one chunk
+        composited in layer order
+        rogue: the roguelike game instance
+        chunk: tuple with the x and y chunk coordinate"""
+        chunk_size = CHUNK_TILES * self.tile_size
+        surface = pygame.Surface((chunk_size, chunk_size)).convert()
+        surface.fill(pygame.Color(0, 0, 0))
+        for flag, tile in ((WALL, WALL_TILE), (FLOOR, FLOOR_TILE), (DOOR, DOOR_TILE)):
+            image = rogue.sprite_handler.get_sprite(tile[0])
+            for x in range(CHUNK_TILES):
+                for y in range(CHUNK_TILES):
+                    cell = (chunk[0] * CHUNK_TILES + x, chunk[1] * CHUNK_TILES + y)
+                    if self.level.terrain_at(cell) & flag:
+                        surface.blit(image, (x * self.tile_size, y * self.tile_size))
+        return surface
+
+    def draw_static(self, rogue, surface):
+        """Blit the baked static layers that are on screen,
+        baking any chunk that isn't cached yet or whose terrain
+        changed since it was baked
+        rogue: the roguelike game instance
+        surface: the surface to draw on"""
+        chunk_size = CHUNK_TILES * self.tile_size
+        xs, ys = self.visible_cells(surface.get_size())
+        for cx in range(xs[0] // CHUNK_TILES, xs[-1] // CHUNK_TILES + 1):
+            for cy in range(ys[0] // CHUNK_TILES, ys[-1] // CHUNK_TILES + 1):
+                chunk = (cx, cy)
+                if chunk in self.chunks and not self.level.changed_cells(
+                        range(cx * CHUNK_TILES, (cx + 1) * CHUNK_TILES),
+                        range(cy * CHUNK_TILES, (cy + 1) * CHUNK_TILES), self.chunks[chunk][0]):
+                    self.chunks.move_to_end(chunk)
+                else:
+                    self.chunks[chunk] = (self.level.version, self.bake_chunk(rogue, chunk))
+                    self.chunks.move_to_end(chunk)
+                    if len(self.chunks) > CHUNK_CACHE_SIZE:
+                        self.chunks.popitem(last=False)
+                surface.blit(self.chunks[chunk][1],
+                             (cx * chunk_size + self.viewport.x, cy * chunk_size + self.viewport.y))
+
     def generate(self, rogue):
-        """Places map sprites
+        """Starts a new level and places the sprites for the items
+        and enemies around the start. The rest of the level is laid
+        out as the hero gets near it, see stream. Terrain gets
+        sprites only once it is on screen, see materialize. If the
+        level was prepared ahead of time only the sprites are left
         rogue: the roguelike game instance"""
+        self.level.prepare()
+        self.stream(rogue, self.start)
 
-        # randomly place floors
-        for x in range(0, 20):
-            for y in range(0,20):
-                if random.random() > 0.2:
-                    FloorSprite(rogue.tile_layers, rogue.sprite_handler, (x, y))
-        FloorSprite(rogue.tile_layers, rogue.sprite_handler, (10, 10))
-
-        is_door_placed = False
-        while(not is_door_placed):
-            x = random.randint(0,20)
-            y = random.randint(0,20)
-            if(not (x == 10 and y == 10)):
-                DoorSprite(rogue.tile_layers, rogue.sprite_handler, (x, y))
-                is_door_placed = True
-        # randomly place items
-        for x in range(0, 20):
-            for y in range(0, 20):
-                if random.random() < 0.09 and not (x == 10 and y == 10):
-                    ItemSprite(rogue.tile_layers, rogue.sprite_handler, (x, y))
-                    FloorSprite(rogue.tile_layers, rogue.sprite_handler, (x, y))
+    def enemy_turn(self, rogue, hero_cell):
+        """Let the enemies take their turn and move their sprites
+        along with them
+        rogue: the roguelike game instance
+        hero_cell: tuple with the hero's x and y tile coordinate"""
+        layer = rogue.tile_layers["TILE_ENEMY"]
+        for x, y, dx, dy in self.level.enemy_turn(hero_cell).tolist():
+            for enemy in layer.at((x, y)):
+                enemy.move((dx, dy))
+                break
 
-        # randomly place enemies
-        for x in range(0, 20):
-            for y in range(0, 20):
-                if random.random() < 0.02 and not (x == 10 and y == 10):
-                    characteristics = Characteristics(616,616,350,350, 66,0,36,1.6, [])
-                    EnemySprite(rogue.tile_layers, rogue.sprite_handler, (x, y), characteristics)
-                    FloorSprite(rogue.tile_layers, rogue.sprite_handler, (x, y))
+    def stream(self, rogue, cell):
+        """Generate any chunks of the level close to a cell that
+        don't exist yet, along with their item and enemy sprites.
+        These aren't written to the level cache, since by now the
+        level arrays hold what happened in play too, so only the
+        chunks laid out by prepare come back from it on a replay
+        rogue: the roguelike game instance
+        cell: tuple with the x and y tile coordinate to stream around"""
+        for chunk in self.level.chunks_near(cell, STREAM_RADIUS):
+            if chunk not in self.spawned:
+                self.level.generate_chunk(chunk)
+                self.spawn(rogue, chunk)
+                self.spawned.add(chunk)
 
-        # place walls wherever there isn't a floor
-        self.wall_placer(rogue)
-
-    def wall_placer(self, rogue):
-        """place walls wherever there isn't floor"""
-        for x in range(-1, 21):
-            for y in range(-1, 21):
-                overlap = False
-                for tile in rogue.tile_layers["TILE_FLOOR"]:
-                    if tile.pos.x == x and tile.pos.y == y:
-                        overlap = True
-                for tile in rogue.tile_layers["TILE_DOOR"]:
-                    if tile.pos.x == x and tile.pos.y == y:
-                        overlap = True
-                for tile in rogue.tile_layers["TILE_ENEMY"]:
-                    if tile.pos.x == x and tile.pos.y == y:
-                        overlap = True
-                for tile in rogue.tile_layers["TILE_ITEM"]:
-                    if tile.pos.x == x and tile.pos.y == y:
-                        overlap = True
-
-                if not overlap and not (x == 10 and y == 10):
-                    WallSprite(rogue.tile_layers, rogue.sprite_handler, (x, y))
+    def spawn(self, rogue, chunk):
+        """Create sprites for the items and enemies in a chunk,
+        reusing pooled ones from earlier levels where there are any
+        rogue: the roguelike game instance
+        chunk: tuple with the x and y chunk coordinate"""
+        region = self.level.chunk_slice(chunk)
+        left = region[0].start - 1
+        top = region[1].start - 1
+        items = self.level.items[region]
+        for x, y in zip(*np.nonzero(items)):
+            rogue.pool.take(ItemSprite, rogue.tile_layers, rogue.sprite_handler,
+                            (left + int(x), top + int(y)), int(items[x, y]))
+        entities = self.level.entities[region]
+        for x, y in zip(*np.nonzero(entities)):
+            # the enemy's stats stay in the level's component arrays
+            characteristics = EntityStats(self.level.enemies, int(entities[x, y]))
+            rogue.pool.take(EnemySprite, rogue.tile_layers, rogue.sprite_handler,
+                            (left + int(x), top + int(y)), characteristics)
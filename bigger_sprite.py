@@ -1,6 +1,10 @@
 import pygame
-import random
 import time
+from array import array
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+from sounds import SOUNDS
+from bundle import load_image
 
 # Define where objects are in our sprite file.
 # Each sprite is 16x16 pixels in size, and the
@@ -20,15 +24,21 @@ ITEM_HEART_TILE = [(1, 1)]
 ITEM_SHIELD_TILE = [(2, 1)]
 ENEMY_TILE = [(0, 1), (4, 1)]
 SPRITE_PATH = "sprites/mousesheet.bmp"
+# how many scaled tiles the sprite handler keeps around
+SPRITE_CACHE_SIZE = 64
+# how many shared tuples of tiles it keeps around
+TILE_SET_CACHE_SIZE = 16
 
 
 class SpriteHandler:
     """Sprite class to handle common sprite operations"""
-    def __init__(self):
+    def __init__(self, sprite_size=256):
+        """Create a new sprite handler
+        sprite_size: size in pixels tiles are drawn at"""
         # load the texture file into a surface
         # the beginner guide on pygame told me
         # that .convert increases render speed
-        self.tilemap = pygame.image.load(SPRITE_PATH).convert()
+        self.tilemap = load_image(SPRITE_PATH).convert()
         self.tilemap_width, self.tilemap_height = self.tilemap.get_size() # 1024 x 1024
 
         # set per-tile size
@@ -41,28 +51,24 @@ class SpriteHandler:
         self.tileset_height = int(self.tilemap_height / self.tile_height)
 
         self.tile_count = self.tileset_height * self.tileset_width
-
-        # initialize a list of the right size of sprites
-        self.sprites = [None for _ in range(self.tile_count)]
-
-        # loop through the coordinates of the tileset, e.g. 256/16
-        for x in range(self.tileset_height):
-            for y in range(self.tileset_width):
-                # set the sprite at a given position to the corresponding
-                # position this is like reshaping a matrix into a 1D vector
-                # of "pixels" where the "pixels" are instead our tiles
-
-                # Later, we can define where the wall or item tiles are and
-                # fetch them using this system,
-                self.sprites[y * self.tileset_width + x] = self.imageHandler((x * self.tile_width,
-                                                                             y * self.tile_height), 256)
+        self.sprite_size = sprite_size
+
+        # scaled tiles are only cut out of the tileset the first
+        # time they are asked for, since a level uses just a
+        # handful of them. keyed by tile position and size, with
+        # the least recently used tile first in line for eviction
+        self.sprites = OrderedDict()
+        # tuples of tiles shared by every sprite that looks the
+        # same, keyed by tile positions and size, least recently
+        # used first like sprites
+        self.tile_sets = OrderedDict()
 
     def imageHandler(self, position, sprite_size):
         """returns a pygame surface containing the
         tile at the given x,y position in terms
         of sprite size
         position: tuple with the position coordinates, order is x,y
-        sprite_size: size of sprite sheet in pixels"""
+        sprite_size: size in pixels to scale the tile up to"""
 
         # new surface sized to the tile size
         image = pygame.Surface((self.tile_width, self.tile_height))
@@ -74,106 +80,185 @@ class SpriteHandler:
                                           self.tile_height))
         # ignore the pink color, treat as transparent
         image.set_colorkey((255, 0, 255))
-        return pygame.transform.scale(image, (256, 256))
-
-    def get_sprite(self, pos):
-        """We reshaped the tileset into a list, but we
-        can still fetch data at an x,y position because
-        we know how we encoded the data
-        pos: position tuple ordered x, y"""
-        return self.sprites[pos[1] * self.tileset_width + pos[0]]
+        return pygame.transform.scale(image, (sprite_size, sprite_size))
+
+    def get_sprite(self, pos, size=None):
+        """returns the tile at an x,y position in the tileset,
+        scaled to the given size. Tiles are sliced and scaled
+        on first use and cached from then on
+        pos: position tuple ordered x, y
+        size: size in pixels of the returned tile, defaults
+        to the handler's sprite size"""
+        if size is None:
+            size = self.sprite_size
+        key = (pos[0], pos[1], size)
+        if key in self.sprites:
+            self.sprites.move_to_end(key)
+        else:
+            self.sprites[key] = self.imageHandler((pos[0] * self.tile_width,
+                                                   pos[1] * self.tile_height), size)
+            if len(self.sprites) > SPRITE_CACHE_SIZE:
+                self.sprites.popitem(last=False)
+        return self.sprites[key]
+
+    def get_tiles(self, positions, size=None):
+        """returns a tuple of the tiles at x,y positions in the
+        tileset. Every call for the same tiles gets the same
+        tuple back, so sprites can share it instead of each
+        keeping a list
+        positions: list of position tuples ordered x, y
+        size: size in pixels of the returned tiles"""
+        key = (tuple(positions), size)
+        if key in self.tile_sets:
+            self.tile_sets.move_to_end(key)
+        else:
+            self.tile_sets[key] = tuple(self.get_sprite(pos, size) for pos in positions)
+            if len(self.tile_sets) > TILE_SET_CACHE_SIZE:
+                self.tile_sets.popitem(last=False)
+        return self.tile_sets[key]
 
 
-class FloorSprite(pygame.sprite.Sprite):
-    """Class Representing a floor tile,
-    inherits pygame's sprite, extending it
-    with method for loading from the sprite file"""
+class SpritePool:
+    """Keeps killed sprites around by class, so a new level
+    can move them into place and add them back to their
+    group instead of allocating new ones"""
 
-    def __init__(self, layer, sprite_sheet, position):
-        """Create new floor sprite instance
+    def __init__(self):
+        """Create a new, empty pool"""
+        # free sprites, keyed by sprite class
+        self.free = {}
+
+    def release(self, sprite):
+        """Kill a sprite and keep it for reuse
+        sprite: the sprite to take off the level"""
+        sprite.kill()
+        self.free.setdefault(type(sprite), []).append(sprite)
+
+    def take(self, sprite_class, layer, sprite_sheet, position, *args):
+        """returns a sprite of the given class placed at a position,
+        a released one if there is one, otherwise a new one
+        sprite_class: the sprite class to get an instance of
         layer: the layer dictionary
         sprite_sheet: the sprite handler
-        position: the desired position of the sprite"""
-        # based on the pygame docs,
-        # we have to also initialize
-        # the parent class
-        self.group = layer["TILE_FLOOR"]
-        pygame.sprite.Sprite.__init__(self, self.group)
-
-        # load the images from the tileset
-        # uses list comprehension to grab
-        # locations from my const and fetches
-        # images for those locations
-        self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in FLOOR_TILE]
-        self.tile = self.tiles[0]
-
-        self.rect = self.tile.get_rect()
-        self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 256
-
-
-class WallSprite(pygame.sprite.Sprite):
-    """Class Representing a wall tile,
-    inherits pygame's sprite, extending it
-    with method for loading from the sprite file"""
+        position: the desired position of the sprite
+        args: the rest of the arguments the class is made with"""
+        free = self.free.get(sprite_class)
+        if free:
+            sprite = free.pop()
+            sprite.posReset(position, *args)
+            return sprite
+        return sprite_class(layer, sprite_sheet, position, *args)
+
+
+class TileSprite(pygame.sprite.Sprite):
+    """Sprite drawn as a tile of the sprite sheet at a tile
+    position, inherits pygame's sprite. The floor, wall, door,
+    hero, enemy and item sprites are all one of these"""
+
+    # name of the layer the sprite goes on, and where its
+    # images are in the sprite sheet
+    LAYER = None
+    TILES = []
+    # levels hold a lot of these, so they keep no per instance
+    # dictionary of their own. pygame's Sprite still has one,
+    # holding just its set of groups
+    __slots__ = ("group", "x", "y", "sprite_sheet", "tiles", "tile", "rect")
 
     def __init__(self, layer, sprite_sheet, position):
-        """Create new wall sprite instance
+        """Create new tile sprite instance
         layer: the layer dictionary
         sprite_sheet: the sprite handler
         position: the desired position of the sprite"""
         # based on the pygame docs,
         # we have to also initialize
         # the parent class
-        self.group = layer["TILE_WALL"]
+        # the position has to be known before joining
+        # the group, since the group indexes sprites by tile.
+        # positions are whole tiles, kept as plain ints
+        self.group = layer[self.LAYER]
+        self.x = int(position[0])
+        self.y = int(position[1])
         pygame.sprite.Sprite.__init__(self, self.group)
 
-        # load the images from the tileset
-        # uses list comprehension to grab
-        # locations from my const and fetches
-        # images for those locations
-        self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in WALL_TILE]
+        self.sprite_sheet = sprite_sheet
+        self.load_tiles()
+        self.rect = self.tile.get_rect()
+        self.update_rect()
+
+    @property
+    def cell(self):
+        """the integer x, y tile coordinate of the sprite"""
+        return self.x, self.y
+
+    @property
+    def size(self):
+        """size of the sprite's tile in pixels"""
+        return self.sprite_sheet.sprite_size
+
+    def load_tiles(self):
+        """fetch the sprite's images from the tileset, shared
+        with every other sprite of its kind"""
+        self.tiles = self.sprite_sheet.get_tiles(self.TILES)
         self.tile = self.tiles[0]
 
+    def update_rect(self):
+        """handles sprite rect location in terms of pixels. Only
+        needed when the sprite moves, not every frame"""
+        self.rect.x = self.x * self.size
+        self.rect.y = self.y * self.size
+
+    def posReset(self, position):
+        """move the sprite into place and add it back to its
+        group, on level change or when it comes out of the
+        sprite pool
+        position: a tuple with x and y values respectively"""
+        self.x = int(position[0])
+        self.y = int(position[1])
         self.rect = self.tile.get_rect()
-        self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 256
+        self.update_rect()
+        self.add(self.group)
 
+    def move(self, delta):
+        """handles tiles
+        delta: tuple with dx and dy, respectively"""
+        self.x += delta[0]
+        self.y += delta[1]
+        self.update_rect()
+        self.group.relocate(self)
 
-class DoorSprite(pygame.sprite.Sprite):
-    """Class Representing a wall tile,
-    inherits pygame's sprite, extending it
-    with method for loading from the sprite file"""
 
-    def __init__(self, layer, sprite_sheet, position):
-        """Create new door sprite instance
-        layer: the layer dictionary
-        sprite_sheet: the sprite handler
-        position: the desired position of the sprite"""
+class FloorSprite(TileSprite):
+    """Class Representing a floor tile"""
+    LAYER = "TILE_FLOOR"
+    TILES = FLOOR_TILE
+    __slots__ = ()
 
-        # based on the pygame docs,
-        # we have to also initialize
-        # the parent class
-        self.group = layer["TILE_DOOR"]
-        pygame.sprite.Sprite.__init__(self, self.group)
 
-        # load the images from the tileset
-        # uses list comprehension to grab
-        # locations from my const and fetches
-        # images for those locations
-        self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in DOOR_TILE]
-        self.tile = self.tiles[0]
+class WallSprite(TileSprite):
+    """Class Representing a wall tile"""
+    LAYER = "TILE_WALL"
+    TILES = WALL_TILE
+    __slots__ = ()
 
-        self.rect = self.tile.get_rect()
-        self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 256
+
+class DoorSprite(TileSprite):
+    """Class Representing a door tile"""
+    LAYER = "TILE_DOOR"
+    TILES = DOOR_TILE
+    __slots__ = ()
 
 
-class HeroSprite(pygame.sprite.Sprite):
-    """Class Representing the player,
-    inherits pygame's sprite, extending it
-    with the method for loading fromt e sprite file
-    """
+class HeroSprite(TileSprite):
+    """Class Representing the player"""
+    LAYER = "TILE_HERO"
+    TILES = PLAYER_TILE
+    __slots__ = ("characteristics", "door_counter")
+    # sounds are shared by every hero
+    hit_sound = SOUNDS.get('sword.wav')
+    item_sound = SOUNDS.get('pickup.wav')
+    #enemy_sound = SOUNDS.get('meow.wav')
+    game_over_sound = SOUNDS.get('evil_laugh.wav')
+    door_sound = SOUNDS.get('checkpoint.wav')
 
     def __init__(self, layer, sprite_sheet, position, characteristics):
         """Create new hero sprite instance
@@ -181,97 +266,77 @@ class HeroSprite(pygame.sprite.Sprite):
         sprite_sheet: the sprite handler
         position: the desired position of the sprite
         characteristics: characteristics instance"""
-        self.group = layer["TILE_HERO"]
-        pygame.sprite.Sprite.__init__(self, self.group)
+        TileSprite.__init__(self, layer, sprite_sheet, position)
         self.characteristics = characteristics
-        self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in PLAYER_TILE]
-        self.tile = self.tiles[0]
-        self.rect = self.tile.get_rect()
-        self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 256
-        self.hit_sound = pygame.mixer.Sound('Sounds/sword.wav')
-        self.item_sound = pygame.mixer.Sound('Sounds/pickup.wav')
-        #self.enemy_sound = pygame.mixer.Sound('Sounds/meow.wav')
         self.door_counter = 1
-        self.game_over_sound = pygame.mixer.Sound('Sounds/evil_laugh.wav')
-        self.door_sound = pygame.mixer.Sound('Sounds/checkpoint.wav')
-
-    def update(self):
-        """handles sprite rect location in terms of pixels"""
-        self.rect.x = self.pos.x * 256
-        self.rect.y = self.pos.y * 256
-
-    def posReset(self, position):
-        """reset the position of the player on level change
-        position: a tuple with x and y values respectively"""
-
-        pygame.sprite.Sprite.__init__(self, self.group)
-        self.rect = self.tile.get_rect()
-        self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 256
-
-    def move(self, delta):
-        """handles tiles
-        delta: tuple with dx and dy, respectively"""
-        self.pos.x += delta[0]
-        self.pos.y += delta[1]
-
 
     def collide(self, layer, delta):
-        """check if character will collide with the given layer:
-        layer: group of sprites
+        """check if character will collide with the given layer,
+        returns the tile it would run into or False:
+        layer: TileGroup of sprites, indexed by tile
         delta: tuple with dx and dy, respectively"""
-        for tile in layer:
-            if (tile.pos.x == self.pos.x + delta[0] and tile.pos.y == self.pos.y + delta[1]):
-                print("wall or enemy collision")
-                return tile
+        tiles = layer.at((self.x + delta[0], self.y + delta[1]))
+        if tiles:
+            print("wall or enemy collision")
+            return tiles[0]
         return False
 
-    def doorCollide(self, layer, delta):
-        """check if character will collide with the given layer:
-        layer: group of sprites
+    def doorCollide(self, level, delta):
+        """check if character will collide with a door:
+        level: the level the character is in
         delta: tuple with dx and dy, respectively"""
-        for tile in layer:
-            if (tile.pos.x == self.pos.x + delta[0] and tile.pos.y == self.pos.y + delta[1]):
-                print("You're done!")
-                self.door_sound.play()
-                self.door_counter += 1
-                return True
+        if level.is_door((self.x + delta[0], self.y + delta[1])):
+            print("You're done!")
+            self.door_sound.play()
+            self.door_counter += 1
+            return True
         return False
 
     def collisionHandler(self, rogue, delta):
-        """Handles movement events for the player
+        """Handles movement events for the player. Terrain comes
+        from the level arrays, enemies and items are looked up
+        once each through their layer's tile index
         rogue: main roguelike game instance
         delta: tuple with dx and dy, respectively"""
-        if self.doorCollide(rogue.tile_layers["TILE_DOOR"], delta):
+        if self.doorCollide(rogue.map.level, delta):
             print("level done!")
             rogue.generate_level()
 
-        if self.collide(rogue.tile_layers["TILE_ENEMY"], delta):
+        # the door may have brought us to a new level
+        level = rogue.map.level
+        target = (self.x + delta[0], self.y + delta[1])
+
+        enemy = self.collide(rogue.tile_layers["TILE_ENEMY"], delta)
+        if enemy:
             # handle damage chance / attach interaction
-            self.attack(self.collide(rogue.tile_layers["TILE_ENEMY"], delta))
+            self.attack(level, enemy)
             print("Health: ", self.characteristics.curr_health, "/", self.characteristics.max_health)
+            if not enemy.alive():
+                rogue.pool.release(enemy)
 
-        if self.collide(rogue.tile_layers["TILE_ITEM"], delta):
+        item = self.collide(rogue.tile_layers["TILE_ITEM"], delta)
+        if item:
             # handle damage chance / attach interaction
-            print("item get", self.collide(rogue.tile_layers["TILE_ITEM"], delta).item.name)
-            self.characteristics.add_item(self.collide(rogue.tile_layers["TILE_ITEM"], delta).item)
-            self.collide(rogue.tile_layers["TILE_ITEM"], delta).kill()
+            print("item get", item.item.name)
+            self.characteristics.add_item(item.item)
+            rogue.pool.release(item)
+            level.remove_item(target)
             self.item_sound.play()
-        if self.collide(rogue.tile_layers["TILE_WALL"], delta):
+        wall = level.is_wall(target)
+        if wall:
             self.hit_sound.play()
-        if not self.collide(rogue.tile_layers["TILE_WALL"], delta) and not self.collide(rogue.tile_layers["TILE_ENEMY"], delta) :
+        # an enemy killed by the attack no longer blocks the way
+        if not wall and not (enemy and enemy.alive()):
             self.move(delta)
 
-    def attack(self, enemy):
+    def attack(self, level, enemy):
         """
-        Handles the subtraction of hero's and enemy's current hp
+        Handles the subtraction of hero's and enemy's current hp,
+        through the level's combat system
+        level: the level the enemy is in
         enemy: a tile instance of the enemy
         """
-        hero_damage_taken = self.characteristics.damage_taken(enemy.characteristics.damage_output())
-        enemy_damage_taken = self.characteristics.damage_taken(self.characteristics.damage_output())
-        self.characteristics.curr_health -= hero_damage_taken
-        enemy.characteristics.curr_health -= enemy_damage_taken
+        self.characteristics.curr_health -= level.fight(self.characteristics, [enemy.cell])
         if (enemy.characteristics.curr_health <= 0):
             #self.enemy_sound.play()
             enemy.tile = enemy.tiles[1]
@@ -282,91 +347,77 @@ class HeroSprite(pygame.sprite.Sprite):
         #self.enemy_sound.play()
         self.hit_sound.play()
 
-class EnemySprite(pygame.sprite.Sprite):
-    """Class Representing the player,
-    inherits pygame's sprite, extending it
-    with the method for loading from the sprite file
-    """
+
+class EnemySprite(TileSprite):
+    """Class Representing an enemy"""
+    LAYER = "TILE_ENEMY"
+    TILES = ENEMY_TILE
+    __slots__ = ("characteristics",)
 
     def __init__(self, layer, sprite_sheet, position, characteristics):
         """Create new enemy sprite instance
         layer: the layer dictionary
         sprite_sheet: the sprite handler
         position: the desired position of the sprite
-        characteristics: characteristics instance"""
-
-        self.group = layer["TILE_ENEMY"]
-        pygame.sprite.Sprite.__init__(self, self.group)
+        characteristics: characteristics instance, or the
+        EntityStats of the enemy's entity"""
+        TileSprite.__init__(self, layer, sprite_sheet, position)
         self.characteristics = characteristics
-        self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in ENEMY_TILE]
+
+    def posReset(self, position, characteristics=None):
+        """reset the position of the enemy, when it is
+        taken out of the sprite pool for a new level
+        position: a tuple with x and y values respectively
+        characteristics: characteristics instance to swap in,
+        keeps the current one when left out"""
+        if characteristics is not None:
+            self.characteristics = characteristics
         self.tile = self.tiles[0]
-        self.rect = self.tile.get_rect()
-        self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 256
+        TileSprite.posReset(self, position)
 
-    def update(self):
-        """handles sprite rect location in terms of pixels"""
-        self.rect.x = self.pos.x * 256
-        self.rect.y = self.pos.y * 256
 
-    def posReset(self, position):
-        """reset the position of the player on level change
-        position: a tuple with x and y values respectively"""
+class ItemSprite(TileSprite):
+    """Class Representing an item"""
+    LAYER = "TILE_ITEM"
+    __slots__ = ("item",)
 
-        pygame.sprite.Sprite.__init__(self, self.group)
-        self.rect = self.tile.get_rect()
-        self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 256
+    def __init__(self, layer, sprite_sheet, position, item_id):
+        """Create new item sprite instance
+        layer: the layer dictionary
+        sprite_sheet: the sprite handler
+        position: the desired position of the sprite
+        item_id: which item it is, as stored in the level, see ITEMS"""
+        # the item definition is shared, not copied
+        self.item = ITEMS[item_id]
+        TileSprite.__init__(self, layer, sprite_sheet, position)
+        print("made a new item tile")
 
-    def move(self, delta):
-        """handles tiles
-        delta: tuple with dx and dy, respectively"""
-        self.pos.x += delta[0]
-        self.pos.y += delta[1]
-
-#    def collide(self, layer, delta):
-#        """check if character will collide with the given layer:
-#        layer: group of sprites
-#        delta: tuple with dx and dy, respectively"""
-#        for tile in layer:
-#            if (tile.pos.x == self.pos.x + delta[0] and tile.pos.y == self.pos.y + delta[1]):
-#                print("wall collision")
-#                return tile
-#        return False
-
-class ItemSprite(pygame.sprite.Sprite):
-    """Class Representing a floor tile,
-    inherits pygame's sprite, extending it
-    with method for loading from the sprite file"""
+    def load_tiles(self):
+        """fetch the images of the sprite's item"""
+        self.tiles = self.sprite_sheet.get_tiles(self.item.tiles)
+        self.tile = self.tiles[0]
 
-    def __init__(self, layer, sprite_sheet, position):
-        # based on the pygame docs,
-        # we have to also initialize
-        # the parent class
-        self.group = layer["TILE_ITEM"]
-        pygame.sprite.Sprite.__init__(self, self.group)
+    def set_item(self, item_id):
+        """Pick the item and its images
+        item_id: which item it is, see ITEMS"""
+        self.item = ITEMS[item_id]
+        self.load_tiles()
 
-        # load the images from the tileset
-        # uses list comprehension to grab
-        # locations from my const and fetches
-        # images for those locations
-        list_of_items = [Potion(), Shield(), Heart()]
-        rand = random.randint(0,2)
-        if(rand == 0):
-            self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in ITEM_POTION_TILE]
-        elif(rand == 1):
-            self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in ITEM_SHIELD_TILE]
-        elif(rand == 2):
-            self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in ITEM_HEART_TILE]
-        self.tile = self.tiles[0]
-        self.item = list_of_items[rand]
-        self.rect = self.tile.get_rect()
-        self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 256
-        print("made a new item tile")
+    def posReset(self, position, item_id):
+        """move a pooled item into place as a new item and
+        add it back to its group
+        position: a tuple with x and y values respectively
+        item_id: which item it becomes, see ITEMS"""
+        self.set_item(item_id)
+        TileSprite.posReset(self, position)
 
 # Defining the stats of the hero and enemy
 class Characteristics:
+    __slots__ = ("version", "_curr_health", "_max_health", "mana",
+                 "atk", "armor", "spd", "true_damage", "items")
+    # sounds are shared by every character
+    item_sound = SOUNDS.get('pickup.wav')
+    damage_sound = SOUNDS.get('squeaka.wav')
 
     def __init__(self, curr_health, max_health, mana, max_mana, atk, true_damage, armor, spd, items):
         """creates a Characteristics object
@@ -378,7 +429,10 @@ class Characteristics:
         true_damage: number, stores the true damage stat
         armor: number, stores the true damage stats
         spd: number, stores the number of attacks per move stat
-        items: list of strings, stores the string of the item inside a list"""
+        items: list of item IDs, see ITEMS"""
+        # counts changes to the stats shown on the HUD, so it
+        # can tell when its cached drawing is out of date
+        self.version = 0
         self.curr_health = curr_health
         self.max_health = max_health
         self.mana = mana
@@ -386,10 +440,31 @@ class Characteristics:
         self.armor = armor
         self.spd = spd
         self.true_damage = true_damage
-        self.items = items
-        self.item_sound = pygame.mixer.Sound('Sounds/pickup.wav')
-        self.damage_sound = pygame.mixer.Sound('Sounds/squeaka.wav')
+        # one byte per item picked up
+        self.items = array("B", items)
+
+
+    @property
+    def curr_health(self):
+        """the current health"""
+        return self._curr_health
 
+    @curr_health.setter
+    def curr_health(self, value):
+        if value != getattr(self, "_curr_health", None):
+            self._curr_health = value
+            self.version += 1
+
+    @property
+    def max_health(self):
+        """the maximum health"""
+        return self._max_health
+
+    @max_health.setter
+    def max_health(self, value):
+        if value != getattr(self, "_max_health", None):
+            self._max_health = value
+            self.version += 1
 
     # a function used to check your current health
     def print_health(self):
@@ -434,8 +509,8 @@ class Characteristics:
 
     def add_item(self, item):
         """
-        adds the string of the item to the items list
-        item: Item, the object that modifies your stats
+        adds the item's ID to the items list
+        item: Item, the definition that modifies your stats
         """
         for key in item.modifiers:
             if (key == "atk"):
@@ -451,50 +526,74 @@ class Characteristics:
                 self.armor += item.modifiers[key]
             if (key == "mana"):
                 self.mana += item.modifiers[key]
-        self.items.append(item.name)
+        self.items.append(item.item_id)
         self.item_sound.play()
 
-class Item:
-    def __init__(self, modifiers, name):
-        """
-        creates an Item object
-        modifiers: dictionary, stores the attributes of the item
-        name: string, stores the name of the item
-        """
-        self.modifiers = modifiers
-        self.name = name
-class Potion(Item):
-    def __init__(self, modifiers = {"health":80}, name = "Doran's Shield"):
-        """
-        creates Doran_shield, an item that modifies max_health and armor
-        Doran shield be initialized by its default values only
-        modifiers: dictionary, stores the attributes of the item
-        name: string, stores the name of the item
-        """
-        Item.__init__(self, modifiers, name)
-        self.modifiers = modifiers
-        self.name = name
-
-class Shield(Item):
-    def __init__(self, modifiers = {"armor": 10}, name = "Doran's Shield"):
-        """
-        creates Doran_shield, an item that modifies max_health and armor
-        Doran shield be initialized by its default values only
-        modifiers: dictionary, stores the attributes of the item
-        name: string, stores the name of the item
-        """
-        Item.__init__(self, modifiers, name)
-        self.modifiers = modifiers
-        self.name = name
-
-class Heart(Item):
-    def __init__(self, modifiers = {"max_health": 10}, name = "Doran's Shield"):
-        """
-        creates Doran_shield, an item that modifies max_health and armor
-        Doran shield be initialized by its default values only
-        modifiers: dictionary, stores the attributes of the item
-        name: string, stores the name of the item
-        """
-        Item.__init__(self, modifiers, name)
-        self.modifiers = modifiers
-        self.name = name
+def component_property(name):
+    """returns a property reading and writing one component
+    of an EntityStats' entity
+    name: the component name"""
+    def get(self):
+        return float(self.components[name][self.entity_id])
+
+    def set(self, value):
+        self.components[name][self.entity_id] = value
+    return property(get, set, doc="the entity's " + name)
+
+
+class EntityStats:
+    """Characteristics of an entity whose stats live in an
+    ecs.Components store. Reads and writes go straight to the
+    component arrays, so systems working on the arrays in bulk
+    and code using the entity one at a time see the same stats"""
+    curr_health = component_property("curr_health")
+    max_health = component_property("max_health")
+    atk = component_property("atk")
+    true_damage = component_property("true_damage")
+    armor = component_property("armor")
+    spd = component_property("spd")
+
+    # the same rules as for any other characteristics
+    damage_output = Characteristics.damage_output
+    damage_taken = Characteristics.damage_taken
+    is_dead = Characteristics.is_dead
+    __slots__ = ("components", "entity_id")
+
+    def __init__(self, components, entity_id):
+        """Create a view on an entity's stats
+        components: the component store the entity is in
+        entity_id: the entity's ID"""
+        self.components = components
+        self.entity_id = entity_id
+
+
+class Item(namedtuple("Item", ["item_id", "name", "modifiers", "tiles"])):
+    """Immutable definition of a kind of item. There is one of
+    these per kind, in ITEMS, shared by every item sprite and
+    inventory that has one
+    item_id: number identifying the item, as stored in the level
+    name: string, the name of the item
+    modifiers: read only mapping from stat name to how much it changes
+    tiles: sprite sheet positions of its images"""
+    __slots__ = ()
+
+
+# every kind of item, keyed by item ID
+ITEMS = {}
+
+
+def register_item(item_id, name, modifiers, tiles):
+    """Add an item definition to ITEMS
+    returns the new item
+    item_id: number identifying the item, counting from 1
+    name: string, the name of the item
+    modifiers: dictionary, stores the attributes of the item
+    tiles: sprite sheet positions of its images"""
+    item = Item(item_id, name, MappingProxyType(dict(modifiers)), tuple(tiles))
+    ITEMS[item_id] = item
+    return item
+
+
+POTION = register_item(1, "Potion", {"health": 80}, ITEM_POTION_TILE)
+SHIELD = register_item(2, "Doran's Shield", {"armor": 10}, ITEM_SHIELD_TILE)
+HEART = register_item(3, "Heart", {"max_health": 10}, ITEM_HEART_TILE)
@@ -0,0 +1,148 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+import pygame
+
+# the packed asset bundle, built by running this file. the game
+# reads assets out of it when it is there, and from the loose
+# files otherwise. rebuild it after changing any asset
+BUNDLE_PATH = "assets.bundle"
+BUNDLE_MAGIC = b"MCAB"
+BUNDLE_VERSION = 1
+# magic, version and index length, in front of the index
+HEADER = struct.Struct("<4sII")
+
+
+class Bundle:
+    """Memory mapped asset bundle. Images are stored as raw
+    pixels and sounds as raw samples in the mixer's format,
+    so nothing has to be decoded when they are read"""
+
+    def __init__(self, path=BUNDLE_PATH):
+        """Open a bundle file
+        path: where the bundle is"""
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, length = HEADER.unpack_from(self.data)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise ValueError("not a version %d asset bundle: %s" % (BUNDLE_VERSION, path))
+        # asset path to where its data is and how to read it
+        self.index = json.loads(self.data[HEADER.size:HEADER.size + length])
+        self.start = HEADER.size + length
+
+    def __contains__(self, path):
+        return path in self.index
+
+    def blob(self, entry):
+        """returns the data of an index entry, read straight
+        out of the mapped file
+        entry: dictionary from the index"""
+        start = self.start + entry["offset"]
+        data = memoryview(self.data)[start:start + entry["length"]]
+        if entry["zlib"]:
+            return zlib.decompress(data)
+        return bytes(data)
+
+    def image(self, path):
+        """returns an image surface, not converted yet
+        path: the image file's path"""
+        entry = self.index[path]
+        return pygame.image.frombuffer(self.blob(entry), entry["size"], entry["format"])
+
+    def sound(self, path):
+        """returns a pygame Sound, or None when the mixer was
+        set up differently than when the bundle was built
+        path: the sound file's path"""
+        entry = self.index[path]
+        if list(pygame.mixer.get_init()) != entry["mixer"]:
+            return None
+        return pygame.mixer.Sound(buffer=self.blob(entry))
+
+
+def open_bundle(path=BUNDLE_PATH):
+    """returns the bundle at a path, or None when there is
+    no usable one
+    path: where the bundle is"""
+    try:
+        return Bundle(path)
+    except (OSError, ValueError):
+        return None
+
+
+def load_image(path):
+    """returns an image, from the bundle when it has it and
+    from its file otherwise
+    path: the image file's path"""
+    if BUNDLE is not None and path in BUNDLE:
+        return BUNDLE.image(path)
+    return pygame.image.load(path)
+
+
+def load_sound(path):
+    """returns a pygame Sound, from the bundle when it has it
+    and from its file otherwise. The mixer has to be initialized
+    path: the sound file's path"""
+    if BUNDLE is not None and path in BUNDLE:
+        sound = BUNDLE.sound(path)
+        if sound is not None:
+            return sound
+    return pygame.mixer.Sound(path)
+
+
+def build(path=BUNDLE_PATH):
+    """Decode every image and sound the game loads and pack
+    them into one bundle file
+    path: where to write the bundle"""
+    from images import IMAGE_DIR, SCREENS
+    from sounds import SOUND_DIR
+    from bigger_sprite import SPRITE_PATH
+
+    pygame.mixer.init()
+    index = {}
+    blobs = []
+    offset = 0
+
+    def add(name, data, entry):
+        nonlocal offset
+        # pixels squash down a lot, samples barely do
+        packed = zlib.compress(data, 6)
+        entry["zlib"] = len(packed) < len(data) // 2
+        if entry["zlib"]:
+            data = packed
+        entry["offset"] = offset
+        entry["length"] = len(data)
+        index[name] = entry
+        blobs.append(data)
+        offset += len(data)
+
+    for name in [SPRITE_PATH] + [IMAGE_DIR + "/" + screen for screen in SCREENS]:
+        image = pygame.image.load(name)
+        # opaque images don't need to carry an alpha channel
+        alpha = bool(image.get_flags() & pygame.SRCALPHA) and pygame.surfarray.pixels_alpha(image).min() < 255
+        format = "RGBA" if alpha else "RGB"
+        add(name, pygame.image.tostring(image, format),
+            {"size": list(image.get_size()), "format": format})
+
+    for name in sorted(os.listdir(SOUND_DIR)):
+        if name.endswith(".wav"):
+            sound = pygame.mixer.Sound(SOUND_DIR + "/" + name)
+            add(SOUND_DIR + "/" + name, sound.get_raw(),
+                {"mixer": list(pygame.mixer.get_init())})
+
+    header = json.dumps(index).encode()
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(header)))
+        f.write(header)
+        for data in blobs:
+            f.write(data)
+    os.replace(path + ".tmp", path)
+    print("packed", len(index), "assets into", path)
+
+
+# the bundle the game loads its assets from, if it was built
+BUNDLE = open_bundle()
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,126 @@
+import numpy as np
+
+# the Characteristics stats a fight depends on
+STATS = ["curr_health", "atk", "true_damage", "armor", "spd"]
+
+
+def stat_block(characteristics):
+    """returns the fight stats of Characteristics instances as a
+    dictionary of arrays, one entry per instance
+    characteristics: list of Characteristics instances"""
+    return {stat: np.array([getattr(c, stat) for c in characteristics], dtype=np.float64)
+            for stat in STATS}
+
+
+def random_stats(rng, count, **ranges):
+    """returns stat blocks with every stat drawn uniformly from a
+    range, for Monte Carlo runs over a spread of stats
+    rng: NumPy random Generator
+    count: how many stat blocks to draw
+    ranges: stat name to a (low, high) tuple, or a fixed number"""
+    stats = {}
+    for stat in STATS:
+        value = ranges[stat]
+        if isinstance(value, tuple):
+            stats[stat] = rng.uniform(value[0], value[1], count)
+        else:
+            stats[stat] = np.full(count, value, dtype=np.float64)
+    return stats
+
+
+def damage_output(stats):
+    """returns the damage and true damage dealt before armor
+    reduction, the same as Characteristics.damage_output
+    stats: dictionary of stat arrays"""
+    return stats["spd"] * stats["atk"], stats["true_damage"]
+
+
+def damage_taken(stats, input_damage):
+    """returns the damage taken, the same as
+    Characteristics.damage_taken
+    stats: dictionary of stat arrays of whoever is hit
+    input_damage: tuple with damage and true damage arrays"""
+    damage, true_damage = input_damage
+    armor = stats["armor"]
+    # both branches are worked out everywhere and picked
+    # between, so keep the one that isn't used from dividing
+    # by zero
+    negative = (2 - (100 / (100 - np.minimum(armor, 0)))) * damage + true_damage
+    positive = (100 / (100 + np.maximum(armor, 0))) * damage + true_damage
+    return np.where(armor <= 0, negative, positive)
+
+
+class CombatReport:
+    """Outcome of a batch of fights, one entry per fight"""
+
+    def __init__(self, won, turns, hero_health, enemy_health):
+        """Create a new combat report
+        won: bool array, if the hero killed the enemy and lived
+        turns: int array, how many attacks the fight took
+        hero_health: float array, the hero's health at the end
+        enemy_health: float array, the enemy's health at the end"""
+        self.won = won
+        self.turns = turns
+        self.hero_health = hero_health
+        self.enemy_health = enemy_health
+
+    def summary(self, percentiles=(5, 25, 50, 75, 95)):
+        """returns a dictionary of win rate, turns to kill and
+        remaining hero health figures
+        percentiles: which percentiles of the distributions to give"""
+        kills = self.turns[self.won]
+        return {
+            "fights": len(self.won),
+            "win_rate": float(self.won.mean()),
+            "turns_to_kill_mean": float(kills.mean()) if len(kills) else None,
+            "turns_to_kill": dict(zip(percentiles, np.percentile(kills, percentiles).tolist()))
+            if len(kills) else None,
+            "hero_health": dict(zip(percentiles, np.percentile(self.hero_health, percentiles).tolist())),
+        }
+
+
+def simulate(hero, enemy, max_turns=1000):
+    """Fight every hero stat block against its enemy stat block,
+    attack by attack the way HeroSprite.attack does. A fight ends
+    when either side is at 0 health or below, and is lost when the
+    hero is, even if the enemy died in the same attack
+    returns a CombatReport
+    hero: dictionary of stat arrays, see STATS
+    enemy: dictionary of stat arrays, broadcast against hero's
+    max_turns: attacks after which a fight is called off as lost"""
+    shape = np.broadcast(*[hero[stat] for stat in STATS] + [enemy[stat] for stat in STATS]).shape
+    hero = {stat: np.broadcast_to(np.asarray(hero[stat], dtype=np.float64), shape) for stat in STATS}
+    enemy = {stat: np.broadcast_to(np.asarray(enemy[stat], dtype=np.float64), shape) for stat in STATS}
+
+    # the damage is the same every attack, so it is worked out once.
+    # HeroSprite.attack takes the enemy's damage with the hero's
+    # armor too, and this has to do the same to match it
+    hero_damage_taken = damage_taken(hero, damage_output(enemy))
+    enemy_damage_taken = damage_taken(hero, damage_output(hero))
+
+    hero_health = hero["curr_health"].copy()
+    enemy_health = enemy["curr_health"].copy()
+    turns = np.zeros(shape, dtype=np.int32)
+    fighting = (hero_health > 0) & (enemy_health > 0)
+    for turn in range(max_turns):
+        if not fighting.any():
+            break
+        # subtract the way the scalar code does, one attack at a
+        # time, so the floating point comes out the same
+        hero_health[fighting] -= hero_damage_taken[fighting]
+        enemy_health[fighting] -= enemy_damage_taken[fighting]
+        turns[fighting] += 1
+        fighting &= (hero_health > 0) & (enemy_health > 0)
+
+    won = (enemy_health <= 0) & (hero_health > 0)
+    return CombatReport(won, turns, hero_health, enemy_health)
+
+
+if __name__ == "__main__":
+    # how the hero's starting stats fare against a spread of enemies
+    rng = np.random.default_rng(0)
+    count = 1000000
+    hero = random_stats(rng, 1, curr_health=616, atk=66, true_damage=0, armor=36, spd=1.6)
+    enemy = random_stats(rng, count, curr_health=(300, 900), atk=(30, 120),
+                         true_damage=(0, 20), armor=(-20, 80), spd=(0.8, 2.4))
+    print(simulate(hero, enemy).summary())
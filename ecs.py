@@ -0,0 +1,128 @@
+import numpy as np
+import combat_sim
+
+
+class Components:
+    """Entity component store. Every component is one contiguous
+    NumPy array indexed by entity ID, so systems can work on all
+    entities at once instead of object by object. ID 0 is never
+    handed out, so grids like Level.entities can use 0 for none"""
+
+    def __init__(self, fields, capacity=64):
+        """Create a new, empty component store
+        fields: dictionary from component name to its dtype, or
+        to a (dtype, shape) tuple for components that are vectors
+        capacity: how many entities to make room for up front"""
+        self.fields = fields
+        # the next entity ID to hand out
+        self.count = 1
+        self.arrays = {}
+        self.alive = np.zeros(capacity, dtype=bool)
+        for name, spec in fields.items():
+            dtype, shape = spec if isinstance(spec, tuple) else (spec, ())
+            self.arrays[name] = np.zeros((capacity,) + shape, dtype=dtype)
+
+    def __getitem__(self, name):
+        """returns the array of a component, indexed by entity ID.
+        The array is replaced when the store grows, so look it
+        up again instead of holding on to it
+        name: the component name"""
+        return self.arrays[name]
+
+    def grow(self):
+        """Double the room for entities in every array"""
+        capacity = 2 * len(self.alive)
+        for name, array in self.arrays.items():
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            self.arrays[name] = grown
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive
+        self.alive = alive
+
+    def spawn(self, **values):
+        """Create an entity
+        returns its entity ID
+        values: component name to the entity's value for it, the
+        components left out start at zero"""
+        if self.count == len(self.alive):
+            self.grow()
+        entity_id = self.count
+        self.count += 1
+        self.alive[entity_id] = True
+        for name, value in values.items():
+            self.arrays[name][entity_id] = value
+        return entity_id
+
+    def kill(self, entity_id):
+        """Mark an entity as gone, its ID is not handed out again
+        entity_id: the entity's ID"""
+        self.alive[entity_id] = False
+
+    def select(self, ids, names):
+        """returns a dictionary of component arrays for some
+        entities, the way combat_sim takes stat blocks
+        ids: array of entity IDs
+        names: list of component names"""
+        return {name: self.arrays[name][ids] for name in names}
+
+    def state(self):
+        """returns every array trimmed to the entities that
+        exist, keyed by name, for saving"""
+        state = {name: array[:self.count] for name, array in self.arrays.items()}
+        state["alive"] = self.alive[:self.count]
+        return state
+
+    def load(self, state):
+        """Replace the contents with arrays from state
+        state: dictionary returned by state"""
+        self.count = len(state["alive"])
+        capacity = len(self.alive)
+        while capacity <= self.count:
+            capacity *= 2
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.alive[:self.count] = state["alive"]
+        for name, array in self.arrays.items():
+            loaded = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            loaded[:self.count] = state[name]
+            self.arrays[name] = loaded
+
+
+def move(components, ids, deltas, blocked):
+    """Movement system, steps entities one tile in bulk. An entity
+    stays put when its target is blocked or when an entity earlier
+    in ids already claimed the same target this step
+    returns the IDs of the entities that moved
+    components: component store with a position component
+    ids: array of entity IDs to move
+    deltas: array of dx, dy rows, one per ID
+    blocked: function taking an array of x, y rows and returning
+    a bool array of which of them can't be entered"""
+    ids = np.asarray(ids)
+    if len(ids) == 0:
+        return ids
+    targets = components["position"][ids] + np.asarray(deltas)
+    free = np.nonzero(~blocked(targets))[0]
+    # first come first served on shared targets
+    _, first = np.unique(targets[free], axis=0, return_index=True)
+    free = np.sort(free[first])
+    components["position"][ids[free]] = targets[free]
+    return ids[free]
+
+
+def attack(components, ids, attacker):
+    """Combat system, one exchange of blows between an attacker
+    and entities in bulk, worked out with the combat_sim rules
+    the same way HeroSprite.attack always has, the attacker's
+    armor counting on both sides
+    returns an array of the damage the attacker takes from each
+    entity, and an array of the IDs of the entities it killed
+    components: component store with the combat_sim.STATS components
+    ids: array of entity IDs being attacked
+    attacker: dictionary of the attacker's stats, see combat_sim.stat_block"""
+    ids = np.asarray(ids)
+    defenders = components.select(ids, combat_sim.STATS)
+    taken = combat_sim.damage_taken(attacker, combat_sim.damage_output(defenders))
+    dealt = combat_sim.damage_taken(attacker, combat_sim.damage_output(attacker))
+    components["curr_health"][ids] -= dealt
+    return taken, ids[components["curr_health"][ids] <= 0]
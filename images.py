@@ -0,0 +1,65 @@
+import pygame
+from concurrent.futures import ThreadPoolExecutor
+from bundle import load_image
+
+# where the full screen images live
+IMAGE_DIR = "sprites/sprite_png"
+# the start, intro, transition and end screens, in the order
+# they are first shown, for preloading while the game sets up
+SCREENS = ["startscreen.png",
+           "storywords1.png", "intro1.png", "storywords2.png", "intro2.png",
+           "storywords3.png", "intro3.png", "storywords4.png", "intro4.png",
+           "instructions.png", "itemguide.png",
+           "fade.png", "deadmau.png", "scaledwinner.png"]
+
+
+class ImageRegistry:
+    """Loads each image file once, converted to the display's
+    pixel format so blitting it needs no conversion, and shares
+    it with everything that draws it"""
+
+    def __init__(self, directory=IMAGE_DIR):
+        """Create a new image registry
+        directory: folder the image files are in"""
+        self.directory = directory
+        # converted images, and images still being read
+        # on the worker thread, keyed by file name
+        self.images = {}
+        self.pending = {}
+        self.workers = None
+
+    def load(self, name):
+        """returns an image file decoded but not converted, this
+        runs on the worker thread when preloading
+        name: file name in the image directory"""
+        return load_image(self.directory + "/" + name)
+
+    def preload(self, names):
+        """Start reading image files on a worker thread, so that
+        get only has to convert them
+        names: list of file names in the image directory"""
+        if self.workers is None:
+            self.workers = ThreadPoolExecutor(max_workers=1)
+        for name in names:
+            if name not in self.images and name not in self.pending:
+                self.pending[name] = self.workers.submit(self.load, name)
+
+    def get(self, name):
+        """returns the converted image for a file, loading it on
+        first use. A display mode has to be set
+        name: file name in the image directory"""
+        if name not in self.images:
+            if name in self.pending:
+                image = self.pending.pop(name).result()
+            else:
+                image = self.load(name)
+            # keep per pixel alpha only where something is see through
+            if image.get_flags() & pygame.SRCALPHA and pygame.surfarray.pixels_alpha(image).min() < 255:
+                self.images[name] = image.convert_alpha()
+            else:
+                self.images[name] = image.convert()
+        return self.images[name]
+
+
+# the one registry the game draws its screens from
+IMAGES = ImageRegistry()
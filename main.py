@@ -14,20 +14,23 @@ import random
 
 from map import Map
 from sprite import SpriteHandler, WallSprite, FloorSprite, HeroSprite, Characteristics
+from render_target import RenderTarget, PROFILES
 
 # Game Class, for handling game loop eventually
 class RogueLike():
-    def __init__(self):
+    def __init__(self, profile="legacy"):
         """Initialize the roguelike game instance. Handles
         utility functions necessary for pygame and the
-        main game loop"""
+        main game loop
+        profile: name of the resolution profile to run at"""
         pygame.init()
-        self.screen = pygame.display.set_mode((700, 700))
+        self.target = RenderTarget(PROFILES[profile])
+        self.screen = self.target.surface
         self.clock = pygame.time.Clock()
 
         # load the sprite image set
-        self.sprite_handler = SpriteHandler()
-        self.map = Map()
+        self.sprite_handler = SpriteHandler(self.target.tile_size)
+        self.map = Map(self.screen.get_width(), self.target.tile_size)
 
         # define layers
         self.tile_layers = {
@@ -42,24 +45,24 @@ class RogueLike():
         """Reblit all sprites onto the main screen"""
 
         # fill the screen with bg color
+        self.screen = self.target.sync()
         self.screen.fill(pygame.Color(0,0,0))
 
+        # update every layer and the viewport once
+        for layer in self.tile_layers:
+            self.tile_layers[layer].update()
+        self.map.viewport_update(self.hero)
+
         # iterate through all tile layers,
         # drawing the tile specified in sprite
         # object locations
         for layer in self.tile_layers:
             for tile in self.tile_layers[layer]:
-                self.tile_layers["TILE_WALL"].update()
-                self.tile_layers["TILE_FLOOR"].update()
-                self.tile_layers["TILE_HERO"].update()
-                self.tile_layers["TILE_DOOR"].update()
-                self.tile_layers["TILE_ITEM"].update()
-                self.tile_layers["TILE_ENEMY"].update()
-                self.map.viewport_update(self.hero)
                 self.screen.blit(tile.tile, self.map.animator(tile))
 
         # write changes to screen
-        pygame.display.flip()
+        self.target.upscale()
+        self.target.present()
 
     def generate_level(self):
         """Delete all tiles in desired layer"""
@@ -70,7 +73,7 @@ class RogueLike():
         #characteristics = Characteristics(616,616,350,66,0,36,1.6, [])
         #self.hero = HeroSprite(self.tile_layers, self.sprite_handler, (10,10), characteristics)
         self.hero.posReset((10,10))
-        self.map = Map()
+        self.map = Map(self.screen.get_width(), self.target.tile_size)
 
         # place sprites/tiles
         self.map.generate(self)
@@ -5,13 +5,15 @@ import random
 # Map Generator Class, for randomly generating a map
 # or for a constant map!
 class Map:
-    def __init__(self):
-        """Create a new handler for map related interactions"""
-        self.viewport = pygame.Rect(0, 0, 700, 700)
-        self.width = 700
-        self.height = 700
-        self.xset = int((700 - 32) / 2)
-        self.yset = int((700 - 32) / 2)
+    def __init__(self, view_size=700, tile_size=32):
+        """Create a new handler for map related interactions
+        view_size: width and height of the frame surface in pixels
+        tile_size: size of a tile in pixels on the frame surface"""
+        self.viewport = pygame.Rect(0, 0, view_size, view_size)
+        self.width = view_size
+        self.height = view_size
+        self.xset = int((view_size - tile_size) / 2)
+        self.yset = int((view_size - tile_size) / 2)
 
     def animator(self, tile):
         """Moves tiles according to the top left of the view port
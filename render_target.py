@@ -0,0 +1,96 @@
+import pygame
+
+# Resolution profiles, shared by main.py and bigger_main.py.
+# window is the window size in pixels, tile_size how big a
+# tile is on screen and native_size how big it is in the
+# sprite sheet. native profiles compose the scene with tiles
+# at their sprite sheet size and scale the whole frame up
+# once, instead of scaling every tile up and blitting it
+# at full size
+PROFILES = {
+    "legacy": {"window": (700, 700), "tile_size": 32, "native_size": 4, "native": False},
+    "legacy_native": {"window": (700, 700), "tile_size": 32, "native_size": 4, "native": True},
+    "bigger": {"window": (2048, 1224), "tile_size": 256, "native_size": 16, "native": False},
+    "bigger_native": {"window": (2048, 1224), "tile_size": 256, "native_size": 16, "native": True}}
+
+
+class RenderTarget:
+    """Surface a frame gets drawn on. At full resolution that
+    is just the window. At native resolution it is a small
+    surface that gets scaled up to the window in one go"""
+
+    def __init__(self, profile):
+        """Open the window for a resolution profile
+        profile: one of the PROFILES dictionaries"""
+        self.native = profile["native"]
+        if self.native:
+            self.tile_size = profile["native_size"]
+            self.scale = profile["tile_size"] // profile["native_size"]
+        else:
+            self.tile_size = profile["tile_size"]
+            self.scale = 1
+
+        self.window = pygame.display.set_mode(profile["window"])
+        self.surface = None
+        self.scaled = None
+        self.sync()
+
+    def sync(self):
+        """Pick up the current window, since other screens may have
+        changed the display mode, resizing the native surface to fit.
+        returns the surface to draw the frame on"""
+        self.window = pygame.display.get_surface()
+        if not self.native:
+            self.surface = self.window
+            return self.surface
+
+        # round up so the scaled frame covers the whole window
+        width = -(-self.window.get_width() // self.scale)
+        height = -(-self.window.get_height() // self.scale)
+        if self.surface is None or self.surface.get_size() != (width, height):
+            self.surface = pygame.Surface((width, height)).convert()
+            self.scaled = pygame.Surface((width * self.scale, height * self.scale)).convert()
+        return self.surface
+
+    def to_window(self, rect):
+        """returns a rect on the frame surface in window pixels
+        rect: pygame rect in frame surface pixels"""
+        return pygame.Rect(rect.x * self.scale, rect.y * self.scale,
+                           rect.width * self.scale, rect.height * self.scale)
+
+    def to_frame(self, point):
+        """returns a point in window pixels on the frame surface,
+        such as where the mouse is
+        point: tuple with the x and y window pixel"""
+        return point[0] // self.scale, point[1] // self.scale
+
+    def upscale(self):
+        """Copy the composed frame onto the window. Nothing to do
+        at full resolution, where the frame already is the window.
+        When the window has a clip rect set only the part of the
+        frame under it gets scaled"""
+        if not self.native:
+            return
+        clip = self.window.get_clip()
+        if clip == self.window.get_rect():
+            pygame.transform.scale(self.surface, self.scaled.get_size(), self.scaled)
+            self.window.blit(self.scaled, (0, 0))
+            return
+
+        # widen the clip out to whole frame pixels
+        left = clip.left // self.scale
+        top = clip.top // self.scale
+        right = -(-clip.right // self.scale)
+        bottom = -(-clip.bottom // self.scale)
+        area = pygame.Rect(left, top, right - left, bottom - top).clip(self.surface.get_rect())
+        part = pygame.transform.scale(self.surface.subsurface(area),
+                                      (area.width * self.scale, area.height * self.scale))
+        self.window.blit(part, (area.x * self.scale, area.y * self.scale))
+
+    def present(self, rects=None):
+        """Show the window on screen
+        rects: list of window rects to push, or None for all of it"""
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
@@ -0,0 +1,71 @@
+import pygame
+from bundle import load_sound
+
+# where the sound files live
+SOUND_DIR = "Sounds"
+# sounds decoded up front by SoundRegistry.preload, since they
+# play during normal turns and decoding one then would stall
+# the game. anything else is only decoded when first played
+PRELOAD = ["sword.wav", "pickup.wav", "squeaka.wav", "checkpoint.wav"]
+
+
+class LazySound:
+    """Stand-in for a pygame Sound that only gets decoded
+    the first time it is played"""
+
+    def __init__(self, registry, name):
+        """Create a handle for a sound file
+        registry: the sound registry that decodes it
+        name: file name in the sound directory"""
+        self.registry = registry
+        self.name = name
+
+    def play(self, *args, **kwargs):
+        """play the sound, takes what pygame's Sound.play takes"""
+        return self.registry.sound(self.name).play(*args, **kwargs)
+
+    def stop(self):
+        """stop the sound if it was ever decoded"""
+        if self.name in self.registry.sounds:
+            self.registry.sounds[self.name].stop()
+
+
+class SoundRegistry:
+    """Decodes each sound file once and shares it with
+    everything that plays it"""
+
+    def __init__(self, directory=SOUND_DIR, manifest=PRELOAD):
+        """Create a new sound registry
+        directory: folder the sound files are in
+        manifest: list of file names to decode in preload"""
+        self.directory = directory
+        self.manifest = manifest
+        # decoded sounds and handed out handles, keyed by file name
+        self.sounds = {}
+        self.handles = {}
+
+    def get(self, name):
+        """returns the shared handle for a sound file, without
+        decoding anything yet
+        name: file name in the sound directory"""
+        if name not in self.handles:
+            self.handles[name] = LazySound(self, name)
+        return self.handles[name]
+
+    def sound(self, name):
+        """returns the decoded pygame Sound for a file,
+        decoding it on first use
+        name: file name in the sound directory"""
+        if name not in self.sounds:
+            self.sounds[name] = load_sound(self.directory + "/" + name)
+        return self.sounds[name]
+
+    def preload(self):
+        """Decode every sound in the manifest. The mixer has
+        to be initialized first"""
+        for name in self.manifest:
+            self.sound(name)
+
+
+# the one registry the game plays its sounds from
+SOUNDS = SoundRegistry()
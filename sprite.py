@@ -20,7 +20,9 @@ SPRITE_PATH = "sprites/sprites_simple.bmp"
 
 class SpriteHandler:
     """Sprite class to handle common sprite operations"""
-    def __init__(self):
+    def __init__(self, sprite_size=32):
+        """Create a new sprite handler
+        sprite_size: size in pixels tiles are drawn at"""
         # load the texture file into a surface
         # the beginner guide on pygame told me
         # that .convert increases render speed
@@ -37,6 +39,7 @@ class SpriteHandler:
         self.tileset_height = int(self.tilemap_height / self.tile_height)
 
         self.tile_count = self.tileset_height * self.tileset_width
+        self.sprite_size = sprite_size
 
         # initialize a list of the right size of sprites
         self.sprites = [None for _ in range(self.tile_count)]
@@ -51,14 +54,14 @@ class SpriteHandler:
                 # Later, we can define where the wall or item tiles are and
                 # fetch them using this system,
                 self.sprites[y * self.tileset_width + x] = self.imageHandler((x * self.tile_width,
-                                                                             y * self.tile_height), 32)
+                                                                             y * self.tile_height), sprite_size)
 
     def imageHandler(self, position, sprite_size):
         """returns a pygame surface containing the
         tile at the given x,y position in terms
         of sprite size
         position: tuple with the position coordinates, order is x,y
-        sprite_size: size of sprite sheet in pixels"""
+        sprite_size: size in pixels to scale the tile up to"""
 
         # new surface sized to the tile size
         image = pygame.Surface((self.tile_width, self.tile_height))
@@ -70,7 +73,7 @@ class SpriteHandler:
                                           self.tile_height))
         # ignore the pink color, treat as transparent
         image.set_colorkey((255, 0, 255))
-        return pygame.transform.scale(image, (32, 32))
+        return pygame.transform.scale(image, (sprite_size, sprite_size))
 
     def get_sprite(self, pos):
         """We reshaped the tileset into a list, but we
@@ -103,9 +106,10 @@ class FloorSprite(pygame.sprite.Sprite):
         self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in FLOOR_TILE]
         self.tile = self.tiles[0]
 
+        self.size = sprite_sheet.sprite_size
         self.rect = self.tile.get_rect()
         self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 32
+        self.rect.topleft = self.pos * self.size
 
 
 class WallSprite(pygame.sprite.Sprite):
@@ -131,9 +135,10 @@ class WallSprite(pygame.sprite.Sprite):
         self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in WALL_TILE]
         self.tile = self.tiles[0]
 
+        self.size = sprite_sheet.sprite_size
         self.rect = self.tile.get_rect()
         self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 32
+        self.rect.topleft = self.pos * self.size
 
 
 class DoorSprite(pygame.sprite.Sprite):
@@ -160,9 +165,10 @@ class DoorSprite(pygame.sprite.Sprite):
         self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in DOOR_TILE]
         self.tile = self.tiles[0]
 
+        self.size = sprite_sheet.sprite_size
         self.rect = self.tile.get_rect()
         self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 32
+        self.rect.topleft = self.pos * self.size
 
 
 class HeroSprite(pygame.sprite.Sprite):
@@ -182,14 +188,15 @@ class HeroSprite(pygame.sprite.Sprite):
         self.characteristics = characteristics
         self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in PLAYER_TILE]
         self.tile = self.tiles[0]
+        self.size = sprite_sheet.sprite_size
         self.rect = self.tile.get_rect()
         self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 32
+        self.rect.topleft = self.pos * self.size
 
     def update(self):
        """handles sprite rect location in terms of pixels"""
-       self.rect.x = self.pos.x * 32
-       self.rect.y = self.pos.y * 32
+       self.rect.x = self.pos.x * self.size
+       self.rect.y = self.pos.y * self.size
 
     def posReset(self, position):
         """reset the position of the player on level change
@@ -198,7 +205,7 @@ class HeroSprite(pygame.sprite.Sprite):
         pygame.sprite.Sprite.__init__(self, self.group)
         self.rect = self.tile.get_rect()
         self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 32
+        self.rect.topleft = self.pos * self.size
 
     def move(self, delta):
        """handles tiles
@@ -275,14 +282,15 @@ class EnemySprite(pygame.sprite.Sprite):
         self.characteristics = characteristics
         self.tiles = [sprite_sheet.get_sprite(tiles) for tiles in ENEMY_TILE]
         self.tile = self.tiles[0]
+        self.size = sprite_sheet.sprite_size
         self.rect = self.tile.get_rect()
         self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 32
+        self.rect.topleft = self.pos * self.size
 
     def update(self):
        """handles sprite rect location in terms of pixels"""
-       self.rect.x = self.pos.x * 32
-       self.rect.y = self.pos.y * 32
+       self.rect.x = self.pos.x * self.size
+       self.rect.y = self.pos.y * self.size
 
     def posReset(self, position):
         """reset the position of the player on level change
@@ -291,7 +299,7 @@ class EnemySprite(pygame.sprite.Sprite):
         pygame.sprite.Sprite.__init__(self, self.group)
         self.rect = self.tile.get_rect()
         self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 32
+        self.rect.topleft = self.pos * self.size
 
     def move(self, delta):
        """handles tiles
@@ -329,9 +337,10 @@ class ItemSprite(pygame.sprite.Sprite):
         self.tile = self.tiles[0]
 
         self.item = Doran_sheild()
+        self.size = sprite_sheet.sprite_size
         self.rect = self.tile.get_rect()
         self.pos = pygame.math.Vector2(position[0], position[1])
-        self.rect.topleft = self.pos * 32
+        self.rect.topleft = self.pos * self.size
         print("made a new item tile")
 
 # Defining the stats of the hero and enemy